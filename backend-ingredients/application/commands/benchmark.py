@@ -0,0 +1,81 @@
+# flake8: noqa: F401
+"""Сравнивает поиск ингредиентов по началу названия в индексе воркера `IngredientIndex`
+и запросом `LIKE` в БД, которым список отвечает, пока индекс не загружен.
+Префиксы длиной от одного до трех символов берутся из названий каталога,
+для каждого способа выводятся p50/p95/p99 в миллисекундах.
+
+.. code-block:: bash
+
+    python application/commands/benchmark.py --requests 5000 --limit 10
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Awaitable, Callable
+
+import __init__
+from sqlalchemy import select
+
+from application.database import db_redis, scoped_session, sessionmanager
+from application.ingredients.managers import IngredientIndex
+from application.ingredients.models import Ingredient
+from application.managers import Manager
+from application.schemas import SearchName
+from application.settings import settings
+
+
+async def measure(search: Callable[[str], Awaitable[list]], prefixes: list[str]) -> dict:
+    latencies = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        await search(prefix)
+        latencies.append(time.perf_counter() - start)
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": round(percentiles[49] * 1000, 3),
+        "p95": round(percentiles[94] * 1000, 3),
+        "p99": round(percentiles[98] * 1000, 3),
+    }
+
+
+async def async_main(args: argparse.Namespace) -> None:
+    try:
+        sessionmanager.init(settings.SQLALCHEMY_DATABASE_URI)
+        async with scoped_session() as session:
+            names = list((await session.execute(select(Ingredient.name))).scalars().all())
+        if not names:
+            raise SystemExit("Каталог ингредиентов пуст, запустите load_json.py")
+
+        rnd = random.Random(0)
+        prefixes = [rnd.choice(names)[: rnd.randint(1, 3)] for _ in range(args.requests)]
+        index = IngredientIndex()
+        await index.load()
+        manager = Manager(Ingredient)
+        columns = Ingredient.list_columns("id", "name", "measurement_unit")
+
+        async def by_index(prefix: str) -> list:
+            return index.search(prefix, args.limit)
+
+        async def by_sql(prefix: str) -> list:
+            params = SearchName(name=prefix, limit=args.limit)
+            return await manager.get_all_list(params, attr_name="name", query_in=columns)
+
+        for name, search in (("index", by_index), ("sql", by_sql)):
+            result = await measure(search, prefixes)
+            print(
+                f"{name:<6} p50 {result['p50']:>8.3f}  p95 {result['p95']:>8.3f}"
+                f"  p99 {result['p99']:>8.3f} мс"
+            )
+    finally:
+        await db_redis.close(close_connection_pool=True)
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поиск ингредиентов: индекс воркера и БД.")
+    parser.add_argument("--requests", type=int, default=2000, help="Поисков на способ")
+    parser.add_argument("--limit", type=int, default=10, help="Ингредиентов в ответе")
+    asyncio.run(async_main(parser.parse_args()))
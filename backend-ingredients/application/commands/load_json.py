@@ -1,14 +1,17 @@
 # flake8: noqa: F401
-"""Загружает данные в таблицу из файла json."""
+"""Загружает данные в таблицу из файла json.
+Повторный запуск с обновленным файлом добавляет новые и обновляет измененные ингредиенты
+по названию, воркеры сервиса перезагружают индекс поиска."""
 import asyncio
 import json
 import os
 
 import __init__
 
-from application.database import sessionmanager
+from application.database import db_redis, sessionmanager
+from application.ingredients.managers import ingredient_index
 from application.ingredients.models import Ingredient
-from application.managers import Manager
+from application.managers import CachedManager
 from application.settings import DATA_ROOT, settings
 
 
@@ -16,17 +19,19 @@ async def async_main() -> None:
     try:
         sessionmanager.init(settings.SQLALCHEMY_DATABASE_URI, "ingredients")
         with open(os.path.join(DATA_ROOT, "ingredients.json"), encoding="utf-8") as file:
-            items = dict((item["name"], item) for item in json.load(file)).values()
-            for item in items:
-                await Manager(Ingredient, "ingredients").create(item)
+            manager = CachedManager(Ingredient, "ingredients")
+            inserted, updated, skipped = await manager.upsert(json.load(file), ["name"])
+            await manager.invalidate()
+            await ingredient_index.publish()
 
-        print("== Успех! ==")
+        print(f"== Успех! Добавлено {inserted}, обновлено {updated}, без изменений {skipped} ==")
 
-    except TypeError:
+    except FileNotFoundError:
         print("Файл <ingredients.json> отсутствует в каталоге data")
     except Exception as e:
         print(f"Ошибка: {e}")
     finally:
+        await db_redis.close(close_connection_pool=True)
         await sessionmanager.close("ingredients")
 
 
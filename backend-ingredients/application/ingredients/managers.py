@@ -1,15 +1,27 @@
+import asyncio
 import logging
+from bisect import bisect_left, insort
 
 from sqlalchemy import Result, delete, func, insert, select
 
-from application.database import scoped_session
+from application.database import db_redis, scoped_session
 from application.ingredients.models import AmountIngredient, Ingredient
-from application.ingredients.schemas import IngredientRecipeCreate
+from application.ingredients.schemas import IngredientRecipeBatch
+from application.settings import settings
 
 logger = logging.getLogger(__name__)
 
 
 class IngredientManager:
+    async def get_ingredients(self, ingredient_ids: list[int]) -> list[dict]:
+        async with scoped_session() as session:
+            query = await session.execute(
+                select(Ingredient.id, Ingredient.name, Ingredient.measurement_unit).where(
+                    Ingredient.id.in_(ingredient_ids)
+                )
+            )
+            return [row._asdict() for row in query.all()]
+
     async def get_amount_ingredient(self, recipe_id: int) -> Result | None:
         async with scoped_session() as session:
             try:
@@ -29,45 +41,71 @@ class IngredientManager:
                 logger.error(e)
                 return None
 
-    async def create_amount_ingredient(self, ingredient_in: IngredientRecipeCreate) -> bool:
+    async def get_amount_ingredients(self, recipe_ids: list[int]) -> dict[int, list]:
+        """Ингредиенты нескольких рецептов одним запросом, сгруппированные по id рецепта."""
         async with scoped_session() as session:
-            try:
-                await session.execute(
-                    insert(AmountIngredient).values(await ingredient_in.to_list())
+            query = await session.execute(
+                select(
+                    AmountIngredient.recipe_id,
+                    func.json_agg(
+                        func.json_build_object(
+                            "id",
+                            Ingredient.id,
+                            "name",
+                            Ingredient.name,
+                            "measurement_unit",
+                            Ingredient.measurement_unit,
+                            "amount",
+                            AmountIngredient.amount,
+                        )
+                    ).label("ingredients"),
                 )
-                await session.commit()
-                return True
-            except Exception as e:
-                await session.rollback()
-                logger.error(e)
-                return False
+                .join(AmountIngredient.ingredient)
+                .where(AmountIngredient.recipe_id.in_(recipe_ids))
+                .group_by(AmountIngredient.recipe_id)
+            )
+            return {recipe_id: ingredients for recipe_id, ingredients in query.all()}
 
-    async def delete_amount_ingredient(self, recipe_id: int) -> Result | None:
+    async def replace_amount_ingredients(self, batch: list[IngredientRecipeBatch]) -> list[int]:
+        """Заменяет ингредиенты рецептов пакета одной транзакцией, `ingredients=None` удаляет их.
+        Рецепты с несуществующими или повторяющимися ингредиентами или неположительным
+        количеством не меняются, их id возвращаются."""
+        ingredient_ids = {
+            items.ingredient_id for recipe in batch for items in recipe.ingredients or []
+        }
         async with scoped_session() as session:
-            try:
-                return await session.execute(
-                    delete(AmountIngredient).where(AmountIngredient.recipe_id == recipe_id)
-                )
-            except Exception as e:
-                await session.rollback()
-                logger.error(e)
-                return None
+            query = await session.execute(
+                select(Ingredient.id).where(Ingredient.id.in_(ingredient_ids))
+            )
+            existing = set(query.scalars().all())
 
-    async def update_amount_ingredient(self, ingredient_in: IngredientRecipeCreate) -> bool:
-        async with scoped_session() as session:
-            try:
-                await session.execute(
-                    delete(AmountIngredient).where(AmountIngredient.recipe_id == ingredient_in.id)
-                )
+            rejected, values = [], []
+            for recipe in batch:
+                rows = [
+                    {
+                        "recipe_id": recipe.id,
+                        "ingredient_id": i.ingredient_id,
+                        "amount": int(i.amount),
+                    }
+                    for i in recipe.ingredients or []
+                ]
+                unique = {r["ingredient_id"] for r in rows}
+                if len(unique) < len(rows) or any(
+                    r["ingredient_id"] not in existing or r["amount"] <= 0 for r in rows
+                ):
+                    rejected.append(recipe.id)
+                else:
+                    values.extend(rows)
+
+            accepted = [recipe.id for recipe in batch if recipe.id not in rejected]
+            if accepted:
                 await session.execute(
-                    insert(AmountIngredient).values(await ingredient_in.to_list())
+                    delete(AmountIngredient).where(AmountIngredient.recipe_id.in_(accepted))
                 )
-                await session.commit()
-                return True
-            except Exception as e:
-                await session.rollback()
-                logger.error(e)
-                return False
+            if values:
+                await session.execute(insert(AmountIngredient).values(values))
+            await session.commit()
+            return rejected
 
     async def get_shopping_cart(self, recipe_id: list[int]) -> list:
         async with scoped_session() as session:
@@ -83,3 +121,90 @@ class IngredientManager:
                 .group_by(Ingredient.id, Ingredient.name, Ingredient.measurement_unit)
             )
             return query.all()
+
+
+class IngredientIndex:
+    """
+    Каталог ингредиентов в памяти воркера, отсортированный по названию без учета регистра,
+    для поиска по началу названия бинарным поиском без обращения к БД.
+    Изменения каталога рассылаются всем воркерам через канал Redis `INGREDIENT_INDEX_CHANNEL`:
+    сообщение с id ингредиента обновляет одну запись, `*` перезагружает весь каталог.
+    """
+
+    RELOAD = "*"
+
+    def __init__(self) -> None:
+        self.is_loaded = False
+        self._keys: list[tuple[str, int]] = []
+        self._items: dict[int, dict] = {}
+
+    @staticmethod
+    def _key(item: dict) -> tuple[str, int]:
+        return item["name"].casefold(), item["id"]
+
+    async def load(self) -> None:
+        async with scoped_session() as session:
+            query = await session.execute(
+                select(Ingredient.id, Ingredient.name, Ingredient.measurement_unit)
+            )
+            self._items = {row.id: row._asdict() for row in query.all()}
+
+        self._keys = sorted(self._key(item) for item in self._items.values())
+        self.is_loaded = True
+
+    async def refresh(self, pk: int) -> None:
+        """Перечитывает из БД один ингредиент после его создания, изменения или удаления."""
+        async with scoped_session() as session:
+            query = await session.execute(
+                select(Ingredient.id, Ingredient.name, Ingredient.measurement_unit).where(
+                    Ingredient.id == pk
+                )
+            )
+            row = query.one_or_none()
+
+        if item := self._items.pop(pk, None):
+            self._keys.pop(bisect_left(self._keys, self._key(item)))
+        if row:
+            self._items[pk] = row._asdict()
+            insort(self._keys, self._key(self._items[pk]))
+
+    def search(self, name: str | None, limit: int, offset: int = 0) -> list[dict]:
+        prefix = (name or "").casefold()
+        start = bisect_left(self._keys, (prefix,)) + offset
+        result = []
+        for key, pk in self._keys[start : start + limit]:
+            if not key.startswith(prefix):
+                break
+            result.append(self._items[pk])
+        return result
+
+    def by_ids(self, ingredient_ids: list[int]) -> list[dict]:
+        return [self._items[pk] for pk in ingredient_ids if pk in self._items]
+
+    async def publish(self, pk: int | str = RELOAD) -> None:
+        await db_redis.publish(settings.INGREDIENT_INDEX_CHANNEL, pk)
+
+    async def listen(self) -> None:
+        """Применяет изменения каталога из других воркеров.
+        После переподключения каталог загружается заново, так как сообщения могли потеряться."""
+        while True:
+            try:
+                async with db_redis.pubsub() as pubsub:
+                    await pubsub.subscribe(settings.INGREDIENT_INDEX_CHANNEL)
+                    await self.load()
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        if message["data"] == self.RELOAD:
+                            await self.load()
+                        else:
+                            await self.refresh(int(message["data"]))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(e)
+                await asyncio.sleep(1)
+
+
+ingredient_index = IngredientIndex()
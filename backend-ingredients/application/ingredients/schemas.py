@@ -46,15 +46,5 @@ class CreateAmountIngredient(BaseModel):
     amount: int | str = 0
 
 
-class IngredientRecipeCreate(BaseSchema):
-    ingredients: list[CreateAmountIngredient] = Form(..., description="Список ингредиентов")
-
-    async def to_list(self) -> list[dict[str, int]]:
-        return [
-            {
-                "recipe_id": self.id,
-                "ingredient_id": items.ingredient_id,
-                "amount": int(items.amount),
-            }
-            for items in self.ingredients
-        ]
+class IngredientRecipeBatch(BaseSchema):
+    ingredients: list[CreateAmountIngredient] | None = None
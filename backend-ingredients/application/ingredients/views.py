@@ -1,41 +1,44 @@
+import json
 from typing import Any
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
 from fastapi.responses import JSONResponse
 from starlette.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 
-from application.auth.permissions import (
-    IsAdmin,
-    IsAuthenticated,
-    PermissionsDependency,
-)
+from application.auth.permissions import IsAdmin, IsAuthenticated, PermissionsDependency
+from application.database import db_redis
 from application.exceptions import NotFoundException
-from application.ingredients.managers import IngredientManager
+from application.ingredients.managers import IngredientManager, ingredient_index
 from application.ingredients.models import Ingredient
 from application.ingredients.schemas import (
     AmountOut,
     IngredientCreate,
     IngredientOut,
-    IngredientRecipeCreate,
+    IngredientRecipeBatch,
     IngredientUpdate,
 )
-from application.managers import Manager
+from application.managers import CachedManager
 from application.schemas import SearchName
+from application.settings import settings
 
 router = APIRouter()
 admin_router = APIRouter()
-ingredient = Manager(Ingredient)
+ingredient = CachedManager(Ingredient)
 
 
 @admin_router.post("/", response_model=IngredientOut, status_code=HTTP_200_OK)
-async def create_ingredient(ingredient_in: IngredientCreate) -> JSONResponse:
+async def create_ingredient(ingredient_in: IngredientCreate) -> Any:
     """Создавать ингредиенты может только администратор."""
-    return await ingredient.create(ingredient_in.dict())
+    if result := await ingredient.create(ingredient_in.dict()):
+        await ingredient_index.publish(result.id)
+    return result
 
 
 @router.get("/", response_model=list[IngredientOut], status_code=HTTP_200_OK)
 async def get_ingredients(params: SearchName = Depends()) -> list:
-    """Список ингредиентов с возможностью поиска по имени."""
+    """Список ингредиентов с возможностью поиска по началу имени без учета регистра."""
+    if ingredient_index.is_loaded:
+        return ingredient_index.search(params.name, params.limit, params.limit * (params.page - 1))
     return await ingredient.get_all_list(
         params,
         attr_name="name",
@@ -46,20 +49,31 @@ async def get_ingredients(params: SearchName = Depends()) -> list:
 recipe_router = APIRouter()
 
 
-@recipe_router.post("/", response_model=None, status_code=HTTP_200_OK)
-async def create_recipe_ingredient(ingredient_in: IngredientRecipeCreate) -> JSONResponse:
-    """Сохранить ингредиенты для рецепта."""
-    if await IngredientManager().create_amount_ingredient(ingredient_in):
-        return JSONResponse({"detail": "OK"}, HTTP_200_OK)
-    return JSONResponse({"detail": "BAD_REQUEST"}, HTTP_400_BAD_REQUEST)
+@recipe_router.post("/batch/", response_model=list[int], status_code=HTTP_200_OK)
+async def replace_recipe_ingredients(
+    batch: list[IngredientRecipeBatch],
+    idempotency_key: str | None = Header(None),
+) -> list[int]:
+    """Заменить ингредиенты нескольких рецептов, возвращает id отклоненных рецептов.<br>
+    Повтор запроса с тем же `Idempotency-Key` возвращает сохраненный ответ."""
+    key = f"idempotency:{idempotency_key}"
+    if idempotency_key and (cached := await db_redis.get(key)) is not None:
+        return json.loads(cached)
 
+    rejected = await IngredientManager().replace_amount_ingredients(batch)
+    if idempotency_key:
+        await db_redis.set(key, json.dumps(rejected), ex=settings.IDEMPOTENCY_TTL)
+    return rejected
 
-@recipe_router.put("/", response_model=None, status_code=HTTP_200_OK)
-async def update_recipe_ingredient(ingredient_in: IngredientRecipeCreate) -> JSONResponse:
-    """Редактирвоать ингредиенты для рецепта."""
-    if await IngredientManager().update_amount_ingredient(ingredient_in):
-        return JSONResponse({"detail": "OK"}, HTTP_200_OK)
-    return JSONResponse({"detail": "BAD_REQUEST"}, HTTP_400_BAD_REQUEST)
+
+@recipe_router.post("/lookup/", response_model=list[IngredientOut], status_code=HTTP_200_OK)
+async def lookup_ingredients(ingredient_ids: list[int]) -> list:
+    """Существующие ингредиенты из переданных id, для проверки рецепта до его сохранения."""
+    if not ingredient_ids:
+        return []
+    if ingredient_index.is_loaded:
+        return ingredient_index.by_ids(ingredient_ids)
+    return await IngredientManager().get_ingredients(ingredient_ids)
 
 
 @recipe_router.get("/shopping_cart/", response_model=list[AmountOut], status_code=HTTP_200_OK)
@@ -69,6 +83,18 @@ async def get_shopping_cart(in_recipes: list[int]) -> JSONResponse:
     return ingredients or JSONResponse({"detail": "BAD_REQUEST"}, HTTP_400_BAD_REQUEST)
 
 
+@recipe_router.post(
+    "/bulk/",
+    response_model=dict[int, list[AmountOut]],
+    status_code=HTTP_200_OK,
+)
+async def get_bulk_recipe_ingredient(in_recipes: list[int]) -> dict[int, list]:
+    """Ингредиенты нескольких рецептов, сгруппированные по id рецепта."""
+    if not in_recipes:
+        return {}
+    return await IngredientManager().get_amount_ingredients(in_recipes)
+
+
 @recipe_router.get("/{recipe_id}/", response_model=list[AmountOut], status_code=HTTP_200_OK)
 async def get_recipe_ingredient(recipe_id: int) -> JSONResponse:
     """Удалить ингредиенты для рецепта."""
@@ -76,14 +102,6 @@ async def get_recipe_ingredient(recipe_id: int) -> JSONResponse:
     return ingredients or JSONResponse({"detail": "BAD_REQUEST"}, HTTP_400_BAD_REQUEST)
 
 
-@recipe_router.delete("/{recipe_id}/", response_model=None, status_code=HTTP_200_OK)
-async def delete_recipe_ingredient(recipe_id: int) -> JSONResponse:
-    """Удалить ингредиенты для рецепта."""
-    if await IngredientManager().delete_amount_ingredient(recipe_id):
-        return JSONResponse({"detail": "OK"}, HTTP_200_OK)
-    return JSONResponse({"detail": "BAD_REQUEST"}, HTTP_400_BAD_REQUEST)
-
-
 router.include_router(
     recipe_router,
     prefix="/recipe",
@@ -105,10 +123,12 @@ async def details_ingredient(ingredient_id: int) -> Any:
     dependencies=[Depends(PermissionsDependency([IsAuthenticated, IsAdmin]))],
     status_code=HTTP_200_OK,
 )
-async def update_ingred(ingredient_id: int, ingredient_in: IngredientUpdate) -> JSONResponse:
+async def update_ingred(ingredient_id: int, ingredient_in: IngredientUpdate) -> Any:
     """Редактировать ингредиенты может только администратор."""
     items = {k: v for k, v in ingredient_in.dict().items() if v}
-    return await ingredient.update(items=items, pk=ingredient_id)
+    result = await ingredient.update(items=items, pk=ingredient_id)
+    await ingredient_index.publish(ingredient_id)
+    return result
 
 
 @router.delete(
@@ -119,3 +139,4 @@ async def update_ingred(ingredient_id: int, ingredient_in: IngredientUpdate) ->
 async def delete_ingredient(ingredient_id: int) -> JSONResponse:
     if not await ingredient.delete(pk=ingredient_id):
         raise NotFoundException("Ингредиент не существует")
+    await ingredient_index.publish(ingredient_id)
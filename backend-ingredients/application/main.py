@@ -1,4 +1,5 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from fastapi.middleware import Middleware
@@ -8,15 +9,22 @@ from sqlalchemy.sql.schema import MetaData
 from starlette.middleware.authentication import AuthenticationMiddleware
 from starlette.requests import Request
 
+from application.auth.managers import AuthTokenRedisManager
 from application.auth.permissions import AuthBackend
-from application.database import Base, sessionmanager
+from application.database import Base, db_redis, sessionmanager
 from application.exceptions import CustomException
+from application.ingredients.managers import ingredient_index
+from application.metrics import MetricsMiddleware
+from application.metrics import router as metrics_router
+from application.metrics import sample_pool_periodically
 from application.routers import router
 from application.settings import settings
+from application.timing import QueryTimingMiddleware
 
 
 def init_routers(app_: FastAPI) -> None:
     app_.include_router(router, prefix=settings.API_V1_STR)
+    app_.include_router(metrics_router)
 
 
 def init_listeners(app_: FastAPI) -> None:
@@ -43,6 +51,8 @@ def on_auth_error(request: Request, exc: Exception) -> JSONResponse:
 
 def make_middleware() -> list[Middleware]:
     middleware = [
+        Middleware(QueryTimingMiddleware),
+        Middleware(MetricsMiddleware),
         Middleware(
             CORSMiddleware,
             allow_origins=settings.BACKEND_CORS_ORIGINS,
@@ -60,15 +70,25 @@ def make_middleware() -> list[Middleware]:
 
 
 def create_app(init_db: bool | None = True) -> FastAPI:
-    lifespan = None
     if init_db:
         sessionmanager.init(settings.SQLALCHEMY_DATABASE_URI)
 
-        @asynccontextmanager
-        async def lifespan(app_: FastAPI):
-            yield
-            if sessionmanager._engine is not None:
-                await sessionmanager.close()
+    @asynccontextmanager
+    async def lifespan(app_: FastAPI):
+        listeners = [
+            asyncio.create_task(AuthTokenRedisManager.listen_invalidation()),
+            asyncio.create_task(sample_pool_periodically()),
+        ]
+        if init_db:
+            listeners.append(asyncio.create_task(ingredient_index.listen()))
+        yield
+        for listener in listeners:
+            listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await listener
+        await db_redis.close(close_connection_pool=True)
+        if init_db and sessionmanager._engine is not None:
+            await sessionmanager.close()
 
     app_ = FastAPI(
         debug=False,
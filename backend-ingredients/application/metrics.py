@@ -0,0 +1,166 @@
+"""
+Метрики приложения в формате Prometheus на `prometheus_client`.
+
+Под gunicorn задается `PROMETHEUS_MULTIPROC_DIR`: каждый воркер пишет значения в свои
+mmap-файлы этого каталога, а `/metrics` любого воркера собирает их `MultiProcessCollector`.
+Каталог очищается при старте gunicorn, gauge завершившихся воркеров удаляются в `child_exit`,
+см. `gunicorn.conf.py`. Без этой переменной, например под `uvicorn --reload`,
+метрики отдаются из памяти процесса.
+
+.. code-block:: python
+
+    YOUR_DURATION = Histogram("your_duration_seconds", "Описание.", ("operation",))
+
+    with YOUR_DURATION.labels("create").time():
+        ...
+"""
+
+import asyncio
+import logging
+import os
+from time import perf_counter
+from typing import Any
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from application.database import sessionmanager
+from application.settings import settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Длительность HTTP запросов.", ("method", "route", "status")
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP запросы в обработке.",
+    ("method",),
+    multiprocess_mode="livesum",
+)
+POOL_GAUGES = (
+    (
+        Gauge("db_pool_size", "Размер пула соединений.", ("schema",), multiprocess_mode="livesum"),
+        "size",
+    ),
+    (
+        Gauge(
+            "db_pool_checked_out",
+            "Соединения, выданные из пула.",
+            ("schema",),
+            multiprocess_mode="livesum",
+        ),
+        "checked_out",
+    ),
+    (
+        Gauge(
+            "db_pool_overflow",
+            "Соединения сверх размера пула.",
+            ("schema",),
+            multiprocess_mode="livesum",
+        ),
+        "overflow",
+    ),
+)
+POOL_COUNTERS = (
+    (Counter("db_pool_checkouts", "Выдачи соединений из пула.", ("schema",)), "checkouts"),
+    (
+        Counter(
+            "db_pool_wait_seconds",
+            "Суммарное время получения соединения из пула.",
+            ("schema",),
+        ),
+        "wait_seconds",
+    ),
+)
+pool_reported: dict[tuple[str, str], float] = {}
+
+
+def sample_pool() -> None:
+    """Переносит состояние пулов воркера в метрики, счетчики увеличиваются на прирост."""
+    for schema, values in sessionmanager.pool_status().items():
+        for gauge, key in POOL_GAUGES:
+            gauge.labels(schema).set(values[key])
+        for counter, key in POOL_COUNTERS:
+            delta = values[key] - pool_reported.get((schema, key), 0)
+            if delta > 0:
+                counter.labels(schema).inc(delta)
+            pool_reported[schema, key] = values[key]
+
+
+async def sample_pool_periodically() -> None:
+    """Раз в `METRICS_POOL_INTERVAL` секунд обновляет метрики пула, запускается в `lifespan`."""
+    while True:
+        try:
+            sample_pool()
+        except Exception as e:
+            logger.error(e)
+        await asyncio.sleep(settings.METRICS_POOL_INTERVAL)
+
+
+def render() -> bytes:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+class MetricsMiddleware:
+    """Время и количество HTTP запросов по шаблонам путей, например `/api/recipes/{pk}/`."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.routes: dict[Any, str] | None = None
+
+    def route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self.routes is None:
+            self.routes = {
+                getattr(route, "endpoint", getattr(route, "app", None)): route.path
+                for route in scope["app"].routes
+            }
+        return self.routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method, start, status = scope["method"], perf_counter(), 500
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            REQUEST_DURATION.labels(method, self.route(scope), str(status)).observe(
+                perf_counter() - start
+            )
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    sample_pool()
+    return Response(await asyncio.to_thread(render), media_type=CONTENT_TYPE_LATEST)
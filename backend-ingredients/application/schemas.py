@@ -1,3 +1,4 @@
+import json
 from typing import Sequence, TypeVar
 
 from fastapi import Query
@@ -30,6 +31,11 @@ class Params(BaseModel):
         description="Количество объектов на странице.",
     )
 
+    @property
+    def cache_key(self) -> str:
+        """Нормализованные параметры запроса вместе с пагинацией, ключ кэша."""
+        return json.dumps(self.model_dump(), sort_keys=True, default=str)
+
     @property
     def has_previous(self) -> bool:
         return self.page > 1
@@ -59,6 +65,6 @@ class SearchName(Params):
     async def search(self, query: Select, attr_name: str, model: Sequence[_TM]) -> Select:
         if self.name:
             if model := getattr(model, attr_name, None):
-                return query.where(model.like(f"{self.name}%"))
+                return query.where(model.ilike(f"{self.name}%"))
 
         return query
@@ -16,6 +16,9 @@ class RedisSettings(BaseSettings):
     REDIS_HOST: str | None = "delibasket-redis"
     REDIS_PORT: int | None = 6379
     REDIS_PASSWORD: str | None = "qwerty"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0
+    REDIS_SOCKET_TIMEOUT: float = 5.0
 
     @property
     def REDIS_URL(self) -> RedisDsn:
@@ -31,8 +34,16 @@ class PostgresSettings(BaseSettings):
     POSTGRES_SERVER_INGREDIENTS: str | None = "delibasket-db-ingredients"
     POSTGRES_PORT_INGREDIENTS: int | None = 5433
 
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_RECYCLE: int = 1800
+    POSTGRES_POOL_TIMEOUT: float = 30.0
+    POSTGRES_POOL_PRE_PING: bool = True
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 100
+    POSTGRES_PGBOUNCER: bool = False
+
     @property
-    def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
+    def SQLALCHEMY_DATABASE_URI(self) -> str:
         return (
             f"postgresql+asyncpg://{self.POSTGRES_USER_INGREDIENTS}:"
             f"{self.POSTGRES_PASSWORD_INGREDIENTS}@"
@@ -45,7 +56,16 @@ class PostgresSettings(BaseSettings):
 class Settings(RedisSettings, PostgresSettings):
     API_V1_STR: str = "/api"
     BACKEND_TOKEN_EXP: int | None = 10
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: int = 30
+    TOKEN_INVALIDATE_CHANNEL: str = "auth:token:invalidate"
     TESTING: bool | None = False
+    SQL_QUERY_BUDGET: int = 20
+    METRICS_POOL_INTERVAL: float = 5.0
+
+    CATALOG_CACHE_TTL: int = 3600
+    INGREDIENT_INDEX_CHANNEL: str = "ingredients:index"
+    IDEMPOTENCY_TTL: int = 86400
 
     BACKEND_CORS_ORIGINS: list[AnyHttpUrl] = []
 
@@ -53,6 +73,11 @@ class Settings(RedisSettings, PostgresSettings):
     def TOKEN_EXP(self) -> timedelta:
         return timedelta(seconds=self.BACKEND_TOKEN_EXP)
 
+    @property
+    def TOKEN_CACHE_EXP(self) -> int:
+        """Время жизни токена в локальном кэше воркера, не больше времени жизни токена."""
+        return min(self.TOKEN_CACHE_TTL, self.BACKEND_TOKEN_EXP or self.TOKEN_CACHE_TTL)
+
 
 class SettingsTest(Settings):
     POSTGRES_NAME_TEST: str | None = "postgres"
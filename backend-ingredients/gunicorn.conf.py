@@ -0,0 +1,30 @@
+"""
+Настройки gunicorn, запуск: `gunicorn -c gunicorn.conf.py application.main:app`.
+
+Воркеры пишут метрики в `PROMETHEUS_MULTIPROC_DIR`, см. `application/metrics.py`.
+"""
+
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "delibasket-ingredients-metrics"),
+)
+
+
+def on_starting(server) -> None:
+    """Файлы прошлого запуска удаляются, иначе их счетчики попадут в новые метрики."""
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker) -> None:
+    """Gauge завершившегося воркера больше не учитываются, счетчики и гистограммы остаются."""
+    # prometheus_client выбирает режим при импорте, а воркеры наследуют модули мастера,
+    # поэтому мастер импортирует его только здесь, после установки переменной окружения
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,73 @@
+import asyncio
+from typing import AsyncIterator, Iterator
+
+import httpx
+import pytest
+from sqlalchemy import insert
+
+from application.database import scoped_session, sessionmanager
+from application.ingredients import views
+from application.ingredients.managers import IngredientIndex
+from application.ingredients.models import Ingredient
+from application.main import create_app
+from application.managers import CachedManager
+from application.settings import settings, settings_test
+
+
+@pytest.fixture(scope="session")
+def event_loop() -> Iterator[asyncio.AbstractEventLoop]:
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def connection_test() -> AsyncIterator[None]:
+    sessionmanager.init(settings_test.SQLALCHEMY_DATABASE_URI_TEST)
+    yield
+    await sessionmanager.close()
+
+
+@pytest.fixture(autouse=True)
+async def create_tables(connection_test: None) -> AsyncIterator[None]:
+    async with sessionmanager.connect() as connection:
+        await sessionmanager.drop_all(connection)
+        await sessionmanager.create_all(connection)
+
+    await CachedManager(Ingredient).invalidate()
+    yield
+
+
+@pytest.fixture
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    app = create_app(init_db=False)
+    async with httpx.AsyncClient(
+        base_url=f"http://test{settings.API_V1_STR}", transport=httpx.ASGITransport(app=app)
+    ) as client:
+        yield client
+
+
+@pytest.fixture
+def index(monkeypatch) -> IngredientIndex:
+    """Отдельный индекс для теста, список ингредиентов отвечает из него после `load`."""
+    index = IngredientIndex()
+    monkeypatch.setattr(views, "ingredient_index", index)
+    return index
+
+
+@pytest.fixture
+def make_ingredients():
+    """Ингредиенты напрямую в БД, возвращает id по названию."""
+
+    async def make_ingredients(*names: str) -> dict[str, int]:
+        async with scoped_session() as session:
+            query = await session.execute(
+                insert(Ingredient)
+                .values([{"name": name, "measurement_unit": "г"} for name in names])
+                .returning(Ingredient.name, Ingredient.id)
+            )
+            await session.commit()
+        await CachedManager(Ingredient).invalidate()
+        return dict(query.all())
+
+    return make_ingredients
@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import delete, update
+
+from application.database import scoped_session
+from application.ingredients.models import Ingredient
+
+NAMES = ("Apple", "apricot", "APRICOT jam", "Banana", "basil", "Соль", "сахар", "Сыр")
+
+
+@pytest.fixture
+async def catalog(make_ingredients) -> dict[str, int]:
+    return await make_ingredients(*NAMES)
+
+
+async def test_index_search_by_casefold_prefix(index, catalog) -> None:
+    await index.load()
+
+    assert [item["name"] for item in index.search("ap", 10)] == ["Apple", "apricot", "APRICOT jam"]
+    assert [item["name"] for item in index.search("APR", 10)] == ["apricot", "APRICOT jam"]
+    assert [item["name"] for item in index.search("ap", 1, offset=1)] == ["apricot"]
+    assert [item["name"] for item in index.search("С", 10)] == ["сахар", "Соль", "Сыр"]
+    assert index.search("cherry", 10) == []
+    assert len(index.search(None, 100)) == len(NAMES)
+
+
+async def test_index_by_ids_keeps_order_and_skips_missing(index, catalog) -> None:
+    await index.load()
+    ids = [catalog["basil"], 0, catalog["Apple"]]
+
+    assert [item["name"] for item in index.by_ids(ids)] == ["basil", "Apple"]
+
+
+async def test_index_refresh(index, catalog) -> None:
+    await index.load()
+    async with scoped_session() as session:
+        await session.execute(
+            update(Ingredient).where(Ingredient.id == catalog["Apple"]).values(name="Cherry")
+        )
+        await session.execute(delete(Ingredient).where(Ingredient.id == catalog["basil"]))
+        await session.commit()
+
+    await index.refresh(catalog["Apple"])
+    await index.refresh(catalog["basil"])
+
+    assert [item["name"] for item in index.search("ap", 10)] == ["apricot", "APRICOT jam"]
+    assert [item["name"] for item in index.search("b", 10)] == ["Banana"]
+    assert index.search("ch", 10) == [
+        {"id": catalog["Apple"], "name": "Cherry", "measurement_unit": "г"}
+    ]
+
+
+@pytest.mark.parametrize("name", ["", "a", "AP", "apricot ", "b", "z"])
+async def test_list_from_index_matches_database(client, index, catalog, name) -> None:
+    params = {"name": name, "limit": 100}
+
+    response = await client.get("/ingredients/", params=params)
+    assert response.status_code == 200
+    from_database = sorted(response.json(), key=lambda item: item["id"])
+
+    await index.load()
+    response = await client.get("/ingredients/", params=params)
+    assert response.status_code == 200
+    from_index = response.json()
+
+    assert from_index == sorted(from_index, key=lambda item: item["name"].casefold())
+    assert sorted(from_index, key=lambda item: item["id"]) == from_database
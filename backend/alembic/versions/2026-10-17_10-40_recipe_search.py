@@ -0,0 +1,42 @@
+"""Recipe full-text and trigram search
+
+Revision ID: 3d7a9e51c6f2
+Revises: 8c1f4e2a9b7d
+Create Date: 2026-10-17 10:40:27.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3d7a9e51c6f2'
+down_revision = '8c1f4e2a9b7d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column(
+        'recipe',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector('russian', coalesce(text, '')), 'B')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index('ix_recipe_search_vector', 'recipe', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_recipe_name_trgm', 'recipe', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recipe_name_trgm', table_name='recipe', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.drop_index('ix_recipe_search_vector', table_name='recipe', postgresql_using='gin')
+    op.drop_column('recipe', 'search_vector')
@@ -0,0 +1,39 @@
+"""Popularity counters
+
+Revision ID: a41c7d93e8b5
+Revises: 6b2e8f0d4a13
+Create Date: 2026-10-17 12:05:11.294736
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7d93e8b5'
+down_revision = '6b2e8f0d4a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('recipe', sa.Column('favorites_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('user', sa.Column('followers_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('user', sa.Column('recipes_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        'UPDATE recipe SET favorites_count = '
+        '(SELECT count(*) FROM favorite WHERE favorite.recipe_id = recipe.id)'
+    )
+    op.execute(
+        'UPDATE "user" SET '
+        'followers_count = (SELECT count(*) FROM follow WHERE follow.author_id = "user".id), '
+        'recipes_count = (SELECT count(*) FROM recipe WHERE recipe.author_id = "user".id)'
+    )
+    op.create_index('ix_recipe_favorites_count_id', 'recipe', ['favorites_count', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recipe_favorites_count_id', table_name='recipe')
+    op.drop_column('user', 'recipes_count')
+    op.drop_column('user', 'followers_count')
+    op.drop_column('recipe', 'favorites_count')
@@ -0,0 +1,25 @@
+"""Recipe image variants
+
+Revision ID: 0f6d2b8e4c19
+Revises: e5f09b3c7d21
+Create Date: 2026-10-17 14:20:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0f6d2b8e4c19'
+down_revision = 'e5f09b3c7d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('recipe', sa.Column('image_variants', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('recipe', 'image_variants')
@@ -0,0 +1,24 @@
+"""Outbox rejected
+
+Revision ID: 9b3e5a71c0d4
+Revises: 0f6d2b8e4c19
+Create Date: 2026-10-17 16:05:12.903417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5a71c0d4'
+down_revision = '0f6d2b8e4c19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('ingredient_outbox', sa.Column('rejected_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('ingredient_outbox', 'rejected_at')
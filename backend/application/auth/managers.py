@@ -1,37 +1,122 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from time import monotonic
 from uuid import uuid4
 
+from prometheus_client import Histogram
+
 from application.auth.schemas import CurrentUser
 from application.database import db_redis
 from application.settings import settings
 from application.users.models import User
 
+logger = logging.getLogger(__name__)
+
 
 def generate_uuid() -> str:
     return str(uuid4().hex)
 
 
+class TokenCache:
+    """
+    Ограниченный LRU кэш `token -> CurrentUser` внутри воркера.
+    Записи живут `ttl` секунд, при переполнении удаляется самая старая.
+    """
+
+    def __init__(self, maxsize: int, ttl: int) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[float, CurrentUser]] = OrderedDict()
+
+    def get(self, token: str) -> CurrentUser | None:
+        if item := self._items.get(token):
+            expires, user = item
+            if expires > monotonic():
+                self._items.move_to_end(token)
+                return user
+            self._items.pop(token, None)
+        return None
+
+    def set(self, token: str, user: CurrentUser) -> None:
+        self._items[token] = (monotonic() + self.ttl, user)
+        self._items.move_to_end(token)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, token: str) -> None:
+        self._items.pop(token, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_EXP)
+REDIS_DURATION = Histogram(
+    "redis_token_duration_seconds",
+    "Длительность запросов к Redis при работе с токенами.",
+    ("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+
 class AuthTokenRedisManager:
     async def create(self, user: User) -> str | None:
         """Создает токен с временем действия."""
         token = generate_uuid()
-        db_redis.hset(
-            token,
-            mapping={
-                "id": user.id,
-                "username": user.username,
-                "is_active": int(user.is_active),
-                "is_staff": int(user.is_staff),
-                "is_superuser": int(user.is_superuser),
-            },
-        )
-        db_redis.expire(token, settings.TOKEN_EXP)
+        with REDIS_DURATION.labels("create").time():
+            async with db_redis.pipeline(transaction=True) as pipe:
+                await (
+                    pipe.hset(
+                        token,
+                        mapping={
+                            "id": user.id,
+                            "username": user.username,
+                            "is_active": int(user.is_active),
+                            "is_staff": int(user.is_staff),
+                            "is_superuser": int(user.is_superuser),
+                        },
+                    )
+                    .expire(token, settings.TOKEN_EXP)
+                    .execute()
+                )
         return token
 
     async def check(self, token: str) -> CurrentUser | None:
         """Возвращает информацию о владельце, после проверки указанного токена."""
-        if items := db_redis.hgetall(token):
-            return CurrentUser(**items)
+        if user := token_cache.get(token):
+            return user
+
+        with REDIS_DURATION.labels("check").time():
+            items = await db_redis.hgetall(token)
+        if items:
+            user = CurrentUser(**items)
+            token_cache.set(token, user)
+            return user
 
     async def delete(self, token: str) -> bool:
         """Удаляет все токены при выходе владельца."""
-        db_redis.delete(token)
+        token_cache.pop(token)
+        with REDIS_DURATION.labels("delete").time():
+            deleted = await db_redis.delete(token)
+            await db_redis.publish(settings.TOKEN_INVALIDATE_CHANNEL, token)
+        return bool(deleted)
+
+    @staticmethod
+    async def listen_invalidation() -> None:
+        """Удаляет из локального кэша токены, удаленные в любом воркере или сервисе.
+        После переподключения кэш очищается, так как сообщения могли быть пропущены."""
+        while True:
+            try:
+                async with db_redis.pubsub() as pubsub:
+                    await pubsub.subscribe(settings.TOKEN_INVALIDATE_CHANNEL)
+                    token_cache.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            token_cache.pop(message["data"])
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(e)
+                await asyncio.sleep(1)
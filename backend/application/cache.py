@@ -0,0 +1,100 @@
+import hashlib
+import logging
+from typing import Awaitable, Callable
+
+from fastapi.responses import Response
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+from starlette.requests import Request
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from application.database import db_redis
+from application.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_HITS = Counter("response_cache_hits", "Ответы, отданные из кэша.", ("prefix",))
+CACHE_MISSES = Counter("response_cache_misses", "Ответы, собранные при промахе кэша.", ("prefix",))
+
+
+class ResponseCache:
+    """
+    Redis кэш готовых JSON ответов с инвалидацией по тегам и поддержкой `ETag`.
+    Каждый ответ хранится в hash `{prefix}:{key}` c полями `body` и `etag`,
+    а ключи ответов собираются в множества `{prefix}:tag:{tag}` для инвалидации.
+
+    .. code-block:: python
+
+        your_cache = ResponseCache("response:your")
+
+        async def your(request: Request):
+            return await your_cache.response(request, your_cache.key(...), ["your_tag"], build)
+
+        await your_cache.invalidate("your_tag")
+    """
+
+    def __init__(self, prefix: str, ttl: int = settings.RESPONSE_CACHE_TTL) -> None:
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def key(self, *parts: object) -> str:
+        digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    async def get(self, key: str) -> tuple[str, str] | None:
+        try:
+            if cached := await db_redis.hgetall(key):
+                return cached["body"], cached["etag"]
+        except RedisError as e:
+            logger.error(e)
+        return None
+
+    async def set(self, key: str, body: str, tags: list[str]) -> str:
+        etag = f'"{hashlib.md5(body.encode()).hexdigest()}"'
+        try:
+            async with db_redis.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping={"body": body, "etag": etag}).expire(key, self.ttl)
+                for tag in tags:
+                    pipe.sadd(self.tag_key(tag), key).expire(self.tag_key(tag), self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(e)
+        return etag
+
+    async def invalidate(self, *tags: str) -> None:
+        try:
+            for tag in tags:
+                tag_key = self.tag_key(tag)
+                keys = await db_redis.smembers(tag_key)
+                await db_redis.delete(tag_key, *keys)
+        except RedisError as e:
+            logger.error(e)
+
+    async def response(
+        self,
+        request: Request,
+        key: str,
+        tags: list[str],
+        build: Callable[[], Awaitable[str]],
+    ) -> Response:
+        """Отдает ответ из кэша или собирает его через `build` и сохраняет.
+        Если `If-None-Match` совпадает с `ETag`, возвращает `304` без тела."""
+        if cached := await self.get(key):
+            CACHE_HITS.labels(self.prefix).inc()
+            (body, etag), state = cached, "HIT"
+        else:
+            CACHE_MISSES.labels(self.prefix).inc()
+            body = await build()
+            etag, state = await self.set(key, body, tags), "MISS"
+
+        headers = {"ETag": etag, "X-Cache": state}
+        if_none_match = request.headers.get("If-None-Match", "")
+        if if_none_match == "*" or etag in [i.strip() for i in if_none_match.split(",")]:
+            return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+
+recipe_cache = ResponseCache("response:recipe")
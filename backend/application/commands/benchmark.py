@@ -0,0 +1,435 @@
+# flake8: noqa: F401
+"""
+Нагрузочный бенчмарк горячих эндпоинтов бэкенда.
+
+Бэкенд запускается в процессе через `httpx.ASGITransport`, API рецептов сервиса ингредиентов
+заменяется фейком в том же процессе, поэтому измеряются бэкенд, Postgres и Redis.
+С `--url` запросы идут по сети в уже запущенные сервисы.
+Для каждого сценария выводятся пропускная способность, p50/p95/p99 и среднее число SQL запросов
+из заголовка `Server-Timing`. Число SQL запросов `recipes_limit_10` и `recipes_limit_100`
+должно совпадать: флаги избранного и списка покупок страницы получаются одним запросом.
+`recipe_detail_during_login` измеряет `recipe_detail`, пока `--login-workers` клиентов
+непрерывно входят в систему: bcrypt считается вне цикла событий и не должен увеличивать p99.
+`recipes_offset_deep` и `recipes_keyset_deep` запрашивают одну и ту же страницу `--deep-page`
+по номеру и по курсору: время `OFFSET` растет с номером страницы, курсора нет.
+`users_me_uncached` перед каждым запросом очищает кэш токенов процесса, разница p99
+с `users_me` показывает выигрыш кэша над чтением токена из Redis. С `--url` кэш
+не очищается и сценарии равны.
+
+`--save-baseline` сохраняет результат в файл `--baseline`, без него результат сравнивается
+с сохраненным: рост p95, падение пропускной способности сверх `--tolerance`, рост числа
+SQL запросов или ошибок завершают запуск с кодом 1.
+
+Запускать на отдельной базе, `--seed` создает пользователей `bench{i}@example.com`,
+рецепты, подписки, избранное и списки покупок.
+
+.. code-block:: bash
+
+    python application/commands/benchmark.py --seed 100000 --users 200
+    python application/commands/benchmark.py --baseline benchmark.json --save-baseline
+    python application/commands/benchmark.py --baseline benchmark.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from itertools import chain
+from typing import Any, Awaitable, Callable, cast
+from urllib.parse import urlparse
+
+import __init__
+import httpx
+from fastapi import APIRouter, Body, Depends, FastAPI
+from importrecipes import batched, copy_batch, generate
+from recount import recount
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from application.auth.managers import token_cache
+from application.cache import recipe_cache
+from application.database import db_redis, scoped_session, sessionmanager
+from application.main import app
+from application.managers import CountManager
+from application.recipes.models import Cart, Favorite, Recipe
+from application.schemas import SearchRecipe
+from application.services import httpclient
+from application.settings import PAGINATION_SIZE, settings
+from application.tags.models import Tag
+from application.users.models import Follow, User
+from application.utils import hash_password
+
+PASSWORD = "benchmark-password"
+EMAIL = "bench{}@example.com"
+QUERIES = re.compile(r'db;desc="(\d+) queries"')
+
+Request = Callable[[httpx.AsyncClient, dict], Awaitable[httpx.Response]]
+
+
+def fake_ingredients(recipe_id: int) -> list[dict[str, Any]]:
+    rnd = random.Random(recipe_id)
+    return [
+        {
+            "id": pk,
+            "name": f"Ингредиент {pk}",
+            "measurement_unit": "г",
+            "amount": rnd.randint(1, 500),
+        }
+        for pk in rnd.sample(range(1, 2187), k=rnd.randint(1, 8))
+    ]
+
+
+def fake_ingredients_app(latency: float) -> FastAPI:
+    """API рецептов сервиса ингредиентов, ответы детерминированы по id рецепта."""
+
+    async def delay() -> None:
+        if latency:
+            await asyncio.sleep(latency)
+
+    router = APIRouter(dependencies=[Depends(delay)])
+
+    @router.post("/batch/")
+    async def batch() -> list[int]:
+        return []
+
+    @router.post("/lookup/")
+    async def lookup(ingredient_ids: list[int] = Body()) -> list[dict]:
+        return [
+            {"id": pk, "name": f"Ингредиент {pk}", "measurement_unit": "г"} for pk in ingredient_ids
+        ]
+
+    @router.post("/bulk/")
+    async def bulk(recipe_ids: list[int] = Body()) -> dict[int, list]:
+        return {pk: fake_ingredients(pk) for pk in recipe_ids}
+
+    @router.get("/shopping_cart/")
+    async def shopping_cart(recipe_ids: list[int] = Body()) -> list[dict]:
+        total: dict[int, dict] = {}
+        for item in chain.from_iterable(fake_ingredients(pk) for pk in recipe_ids):
+            if item["id"] in total:
+                total[item["id"]]["amount"] += item["amount"]
+            else:
+                total[item["id"]] = item
+        return list(total.values())
+
+    @router.get("/{recipe_id}/")
+    async def detail(recipe_id: int) -> list[dict]:
+        return fake_ingredients(recipe_id)
+
+    fake = FastAPI()
+    fake.include_router(router, prefix=urlparse(settings.INGREDIENTS_URL).path.rstrip("/"))
+    return fake
+
+
+async def insert_ignore(model: type, rows: list[dict]) -> None:
+    for chunk in batched(rows, 5000):
+        async with scoped_session() as session:
+            await session.execute(pg_insert(model).values(chunk).on_conflict_do_nothing())
+            await session.commit()
+
+
+async def seed(args: argparse.Namespace) -> None:
+    """Пользователи, рецепты через `COPY` из `importrecipes` и связи между ними."""
+    password = await hash_password(PASSWORD)
+    await insert_ignore(
+        User,
+        [
+            {
+                "email": EMAIL.format(i),
+                "username": f"bench{i}",
+                "first_name": "Бенчмарк",
+                "last_name": str(i),
+                "password": password,
+            }
+            for i in range(args.users)
+        ],
+    )
+    user_ids = [user["id"] for user in await bench_users(args.users)]
+
+    async with scoped_session() as session:
+        query = await session.execute(select(Tag.slug, Tag.id))
+        tag_ids = {slug: pk for slug, pk in query.all()}
+
+    per_author = max(args.seed // len(user_ids), 1)
+    recipes = chain.from_iterable(
+        generate(per_author, pk, list(tag_ids), args.max_ingredient) for pk in user_ids
+    )
+    for batch in batched(recipes, 10000):
+        async with scoped_session() as session:
+            await copy_batch(session, batch, tag_ids)
+            await session.commit()
+        print(f"Рецептов: +{len(batch)}")
+
+    recipe_ids = await bench_recipes(user_ids, limit=None)
+    relations = (
+        (Follow, "author_id", user_ids, args.follows),
+        (Favorite, "recipe_id", recipe_ids, args.favorites),
+        (Cart, "recipe_id", recipe_ids, args.favorites),
+    )
+    for model, column, targets, count in relations:
+        rows = [
+            {"user_id": user_id, column: target}
+            for user_id in user_ids
+            for target in random.sample(targets, k=min(count, len(targets)))
+            if target != user_id or model is not Follow
+        ]
+        await insert_ignore(model, rows)
+
+    async with scoped_session() as session:
+        await recount(session)
+        await session.commit()
+
+    await CountManager(Recipe).invalidate()
+    await recipe_cache.invalidate("recipe_list")
+
+
+async def bench_users(limit: int) -> list[dict]:
+    async with scoped_session() as session:
+        query = await session.execute(
+            select(User.id, User.email)
+            .where(User.email.like(EMAIL.format("%")))
+            .order_by(User.id)
+            .limit(limit)
+        )
+        return [{"id": pk, "email": email} for pk, email in query.all()]
+
+
+async def bench_recipes(author_ids: list[int], limit: int | None = 10000) -> list[int]:
+    async with scoped_session() as session:
+        query = await session.execute(
+            select(Recipe.id).where(Recipe.author_id.in_(author_ids)).limit(limit)
+        )
+        return list(query.scalars().all())
+
+
+async def deep_cursor(page: int, limit: int) -> str | None:
+    """Курсор, с которым keyset пагинация отдает те же рецепты, что и страница `page`."""
+    if page < 2:
+        return None
+    async with scoped_session() as session:
+        query = await session.execute(
+            select(*SearchRecipe.keyset_columns)
+            .order_by(*(column.desc() for column in SearchRecipe.keyset_columns))
+            .offset(limit * (page - 1) - 1)
+            .limit(1)
+        )
+        row = query.first()
+    return SearchRecipe.encode_cursor(row) if row else None
+
+
+def scenarios(
+    recipe_ids: list[int], tags: list[str], deep_page: int, cursor: str | None
+) -> dict[str, Request]:
+    api = settings.API_V1_STR
+
+    async def me_uncached(client: httpx.AsyncClient, user: dict) -> httpx.Response:
+        token_cache.clear()
+        return await client.get(f"{api}/users/me/", headers=user["headers"])
+
+    return {
+        "recipes_anonymous": lambda client, user: client.get(f"{api}/recipes/"),
+        "recipes_tags": lambda client, user: client.get(
+            f"{api}/recipes/",
+            params={"tags": random.sample(tags, k=min(2, len(tags))), "tags_match": "any"},
+            headers=user["headers"],
+        ),
+        "recipes_favorited": lambda client, user: client.get(
+            f"{api}/recipes/", params={"is_favorited": True}, headers=user["headers"]
+        ),
+        "recipes_limit_10": lambda client, user: client.get(
+            f"{api}/recipes/", params={"limit": 10}, headers=user["headers"]
+        ),
+        "recipes_limit_100": lambda client, user: client.get(
+            f"{api}/recipes/", params={"limit": 100}, headers=user["headers"]
+        ),
+        "recipes_offset_deep": lambda client, user: client.get(
+            f"{api}/recipes/", params={"page": deep_page}, headers=user["headers"]
+        ),
+        "recipes_keyset_deep": lambda client, user: client.get(
+            f"{api}/recipes/", params={"cursor": cursor}, headers=user["headers"]
+        ),
+        "recipe_detail": lambda client, user: client.get(
+            f"{api}/recipes/{random.choice(recipe_ids)}/", headers=user["headers"]
+        ),
+        "users_me": lambda client, user: client.get(f"{api}/users/me/", headers=user["headers"]),
+        "users_me_uncached": me_uncached,
+        "subscriptions": lambda client, user: client.get(
+            f"{api}/users/subscriptions/", headers=user["headers"]
+        ),
+        "shopping_cart": lambda client, user: client.get(
+            f"{api}/recipes/download_shopping_cart/", headers=user["headers"]
+        ),
+        "login": lambda client, user: client.post(
+            f"{api}/auth/token/login/", json={"email": user["email"], "password": PASSWORD}
+        ),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    request: Request,
+    users: list[dict],
+    count: int,
+    args: argparse.Namespace,
+    background: Request | None = None,
+) -> dict[str, float]:
+    """`background`, если задан, выполняется без замеров параллельно с замеряемыми запросами."""
+    latencies: list[float] = []
+    queries: list[int] = []
+    errors = 0
+
+    async def worker(numbers: Any, record: bool) -> None:
+        nonlocal errors
+        for number in numbers:
+            user = users[number % len(users)]
+            start = time.perf_counter()
+            response = await request(client, user)
+            if not record:
+                continue
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+            if match := QUERIES.search(response.headers.get("Server-Timing", "")):
+                queries.append(int(match[1]))
+
+    async def load(request: Request, number: int) -> None:
+        while True:
+            await request(client, users[number % len(users)])
+
+    loaders: list[asyncio.Task] = []
+    if background is not None:
+        loaders = [asyncio.create_task(load(background, i)) for i in range(args.login_workers)]
+    try:
+        for numbers, record in ((iter(range(args.warmup)), False), (iter(range(count)), True)):
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(numbers, record) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        for loader in loaders:
+            loader.cancel()
+        await asyncio.gather(*loaders, return_exceptions=True)
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50": round(percentiles[49] * 1000, 2),
+        "p95": round(percentiles[94] * 1000, 2),
+        "p99": round(percentiles[98] * 1000, 2),
+        "queries": round(statistics.fmean(queries), 2) if queries else 0,
+        "errors": errors,
+    }
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    failures = []
+    for name, result in results.items():
+        if not (base := baseline.get(name)):
+            continue
+        if result["p95"] > base["p95"] * (1 + tolerance):
+            failures.append(f"{name}: p95 {result['p95']} мс, было {base['p95']} мс")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            failures.append(f"{name}: {result['rps']} запросов/с, было {base['rps']}")
+        if result["queries"] > base["queries"]:
+            failures.append(f"{name}: {result['queries']} SQL запросов, было {base['queries']}")
+        if result["errors"] > base["errors"]:
+            failures.append(f"{name}: {result['errors']} ошибок, было {base['errors']}")
+    return failures
+
+
+async def benchmark(args: argparse.Namespace) -> dict[str, dict]:
+    users = await bench_users(args.sessions)
+    if not users:
+        raise SystemExit("Нет пользователей бенчмарка, запустите с --seed")
+    recipe_ids = await bench_recipes([user["id"] for user in users])
+    async with scoped_session() as session:
+        tags = list((await session.execute(select(Tag.slug))).scalars().all())
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        fake = fake_ingredients_app(args.latency / 1000)
+        httpclient.init(settings.INGREDIENTS_URL, httpx.ASGITransport(app=cast(Any, fake)))
+        client = httpx.AsyncClient(
+            base_url="http://benchmark",
+            transport=httpx.ASGITransport(app=cast(Any, app)),
+            timeout=60,
+        )
+
+    results = {}
+    async with client:
+        for user in users:
+            response = await client.post(
+                f"{settings.API_V1_STR}/auth/token/login/",
+                json={"email": user["email"], "password": PASSWORD},
+            )
+            user["headers"] = {"Authorization": f"Token {response.json()['auth_token']}"}
+
+        cursor = await deep_cursor(args.deep_page, PAGINATION_SIZE)
+        requests = scenarios(recipe_ids, tags, args.deep_page, cursor)
+        requests["recipe_detail_during_login"] = requests["recipe_detail"]
+        for name, request in requests.items():
+            if args.only and name not in args.only:
+                continue
+            count = args.login_requests if name == "login" else args.requests
+            background = requests["login"] if name == "recipe_detail_during_login" else None
+            results[name] = result = await run_scenario(
+                client, request, users, count, args, background
+            )
+            print(
+                f"{name:<26} {result['rps']:>8.1f} запросов/с  p50 {result['p50']:>7.1f}"
+                f"  p95 {result['p95']:>7.1f}  p99 {result['p99']:>7.1f} мс"
+                f"  SQL {result['queries']:>5.1f}  ошибок {result['errors']}"
+            )
+
+    if not args.url:
+        await httpclient.close()
+    return results
+
+
+async def async_main(args: argparse.Namespace) -> dict[str, dict]:
+    try:
+        if args.seed:
+            await seed(args)
+        return await benchmark(args)
+    finally:
+        await db_redis.close(close_connection_pool=True)
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк горячих эндпоинтов.")
+    parser.add_argument("--seed", type=int, default=0, help="Создать N рецептов перед запуском")
+    parser.add_argument("--users", type=int, default=200, help="Пользователей при --seed")
+    parser.add_argument("--follows", type=int, default=20, help="Подписок на пользователя")
+    parser.add_argument("--favorites", type=int, default=20, help="Избранного и покупок")
+    parser.add_argument("--max-ingredient", type=int, default=2186, help="Максимальный id")
+    parser.add_argument("--sessions", type=int, default=20, help="Авторизованных клиентов")
+    parser.add_argument("--requests", type=int, default=1000, help="Запросов на сценарий")
+    parser.add_argument("--login-requests", type=int, default=50, help="Запросов входа")
+    parser.add_argument("--login-workers", type=int, default=4, help="Входов параллельно")
+    parser.add_argument("--warmup", type=int, default=50, help="Запросов прогрева")
+    parser.add_argument("--concurrency", type=int, default=20, help="Параллельных клиентов")
+    parser.add_argument("--deep-page", type=int, default=500, help="Страница для OFFSET и курсора")
+    parser.add_argument("--latency", type=float, default=0, help="Задержка фейка ингредиентов, мс")
+    parser.add_argument("--url", help="Адрес запущенного бэкенда вместо запуска в процессе")
+    parser.add_argument("--only", nargs="*", help="Запустить только указанные сценарии")
+    parser.add_argument("--baseline", help="Файл базовых значений")
+    parser.add_argument("--save-baseline", action="store_true", help="Сохранить результат")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение")
+    arguments = parser.parse_args()
+
+    results = asyncio.run(async_main(arguments))
+    if arguments.baseline and arguments.save_baseline:
+        with open(arguments.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"Базовые значения сохранены в {arguments.baseline}")
+    elif arguments.baseline and os.path.isfile(arguments.baseline):
+        with open(arguments.baseline, encoding="utf-8") as file:
+            failures = compare(results, json.load(file), arguments.tolerance)
+        for failure in failures:
+            print(f"Регрессия: {failure}")
+        sys.exit(1 if failures else 0)
@@ -49,7 +49,7 @@ class Createsuperuser:
             if value != getpass.getpass(f"Повторите {key}: ").strip():
                 print("Пароли не совпадают")
                 return self.check(key)
-            value = bcrypt.hashpw(bytes(value, "utf-8"), bcrypt.gensalt())
+            value = bcrypt.hashpw(bytes(value, "utf-8"), bcrypt.gensalt(settings.BCRYPT_ROUNDS))
 
         else:
             value = input(f"Введите {key}: ").strip()
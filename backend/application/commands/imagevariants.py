@@ -0,0 +1,45 @@
+# flake8: noqa: F401
+""" Создает уменьшенные копии картинок рецептов, у которых их еще нет. """
+
+import asyncio
+
+import __init__
+from sqlalchemy import select
+
+from application.database import db_redis, sessionmanager
+from application.recipes.images import image_executor, process_image
+from application.recipes.models import Recipe
+from application.settings import settings
+from application.tags.models import recipe_tag
+
+
+async def async_main() -> None:
+    sessionmanager.init(settings.SQLALCHEMY_DATABASE_URI)
+    image_executor.init()
+    try:
+        async with sessionmanager.scoped_session() as session:
+            query = await session.execute(
+                select(Recipe.id, Recipe.image).where(
+                    Recipe.image_variants.is_(None), Recipe.image.is_not(None)
+                )
+            )
+            recipes = query.all()
+
+        semaphore = asyncio.Semaphore(settings.IMAGE_MAX_WORKERS * 2)
+
+        async def process(recipe_id: int, filename: str) -> None:
+            async with semaphore:
+                await process_image(recipe_id, filename)
+
+        await asyncio.gather(*(process(pk, image) for pk, image in recipes))
+        print(f"== Обработано картинок: {len(recipes)} ==")
+
+    finally:
+        image_executor.shutdown()
+        await db_redis.close(close_connection_pool=True)
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    # процессы `image_executor` запускаются через spawn и импортируют этот модуль заново
+    asyncio.run(async_main())
@@ -0,0 +1,243 @@
+# flake8: noqa: F401
+"""
+Массовый импорт рецептов через `COPY`.
+
+Рецепты читаются потоком и сохраняются пакетами: `recipe`, `recipe_tag` и `ingredient_outbox`
+пишутся `copy_records_to_table` в одной транзакции на пакет. Ингредиенты отправляет
+в сервис ингредиентов диспетчер outbox работающего бэкенда.
+Ошибка в пакете откатывает только этот пакет, импорт продолжается.
+
+JSON Lines, по рецепту в строке:
+    {"author_id": 1, "name": "Борщ", "text": "...", "cooking_time": 60, "image": "borsch.png",
+     "tags": ["lunch"], "ingredients": [{"id": 1, "amount": 200}]}
+
+CSV с заголовком `author_id,name,text,cooking_time,image,tags,ingredients`,
+теги через `|`, ингредиенты `id:amount` через `|`.
+
+.. code-block:: bash
+
+    python application/commands/importrecipes.py recipes.jsonl
+    python application/commands/importrecipes.py recipes.csv --batch 5000
+    python application/commands/importrecipes.py --generate 1000000 --author 1
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Iterable, Iterator, cast
+
+import __init__
+from asyncpg import Connection
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from application.cache import recipe_cache
+from application.database import db_redis, sessionmanager
+from application.managers import CountManager
+from application.recipes.models import Recipe
+from application.settings import settings
+from application.tags.models import Tag
+from application.users.models import User
+
+WORDS = (
+    "борщ",
+    "суп",
+    "салат",
+    "пирог",
+    "каша",
+    "котлеты",
+    "блины",
+    "запеканка",
+    "рагу",
+    "плов",
+    "курица",
+    "говядина",
+    "грибы",
+    "сыр",
+    "томаты",
+    "картофель",
+)
+
+
+def read_jsonl(path: str) -> Iterator[dict[str, Any]]:
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path: str) -> Iterator[dict[str, Any]]:
+    with open(path, encoding="utf-8", newline="") as file:
+        for row in csv.DictReader(file):
+            yield {
+                **row,
+                "tags": [slug for slug in row.get("tags", "").split("|") if slug],
+                "ingredients": [
+                    {"id": pk, "amount": amount}
+                    for pk, amount in (
+                        item.split(":") for item in row.get("ingredients", "").split("|") if item
+                    )
+                ],
+            }
+
+
+def generate(
+    count: int, author_id: int, tags: list[str], max_ingredient: int
+) -> Iterator[dict[str, Any]]:
+    """Случайные рецепты для нагрузочного тестирования."""
+    for _ in range(count):
+        words = random.choices(WORDS, k=random.randint(2, 4))
+        yield {
+            "author_id": author_id,
+            "name": f"{' '.join(words).capitalize()} {uuid.uuid4().hex[:12]}",
+            "text": " ".join(random.choices(WORDS, k=30)),
+            "cooking_time": random.randint(1, 255),
+            "image": f"{uuid.uuid4().hex}.png",
+            "tags": random.sample(tags, k=min(len(tags), random.randint(1, 3))),
+            "ingredients": [
+                {"id": pk, "amount": random.randint(1, 500)}
+                for pk in random.sample(range(1, max_ingredient + 1), k=random.randint(1, 8))
+            ],
+        }
+
+
+def batched(items: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+async def copy_batch(session: AsyncSession, recipes: list[dict], tag_ids: dict[str, int]) -> None:
+    """Id рецептов заранее берутся из последовательности, чтобы связать теги и outbox без
+    `RETURNING`. Первый запрос открывает транзакцию, в которой затем выполняется `COPY`."""
+    query = await session.execute(
+        select(func.nextval("recipe_id_seq")).select_from(func.generate_series(1, len(recipes)))
+    )
+    ids = query.scalars().all()
+    now, pub_date = datetime.utcnow(), datetime.now(timezone.utc)
+
+    recipe_rows: list[tuple] = []
+    tag_rows: list[tuple[int, int]] = []
+    outbox_rows: list[tuple] = []
+    for pk, recipe in zip(ids, recipes):
+        recipe_rows.append(
+            (
+                pk,
+                int(recipe["author_id"]),
+                recipe["name"],
+                recipe["image"],
+                recipe["text"],
+                int(recipe["cooking_time"]),
+                pub_date,
+                now,
+                now,
+            )
+        )
+        tag_rows.extend((pk, tag_ids[slug]) for slug in set(recipe["tags"]) if slug in tag_ids)
+        ingredients = [
+            {"ingredient_id": int(item["id"]), "amount": int(item["amount"])}
+            for item in recipe["ingredients"]
+        ]
+        outbox_rows.append((pk, json.dumps(ingredients), now, now, now))
+
+    connection = await (await session.connection()).get_raw_connection()
+    copy = cast(Connection, connection.driver_connection).copy_records_to_table
+    await copy(
+        "recipe",
+        records=recipe_rows,
+        columns=(
+            "id",
+            "author_id",
+            "name",
+            "image",
+            "text",
+            "cooking_time",
+            "pub_date",
+            "created_at",
+            "updated_at",
+        ),
+    )
+    await copy("recipe_tag", records=tag_rows, columns=("recipe_id", "tag_id"))
+    await copy(
+        "ingredient_outbox",
+        records=outbox_rows,
+        columns=("recipe_id", "ingredients", "available_at", "created_at", "updated_at"),
+    )
+
+
+async def async_main(args: argparse.Namespace) -> None:
+    sessionmanager.init(settings.SQLALCHEMY_DATABASE_URI, "import")
+    imported, failed = 0, 0
+    authors: set[int] = set()
+    started = time.monotonic()
+    try:
+        async with sessionmanager.scoped_session("import") as session:
+            query = await session.execute(select(Tag.slug, Tag.id))
+            tag_ids = {slug: pk for slug, pk in query.all()}
+
+        if args.generate:
+            recipes = generate(args.generate, args.author, list(tag_ids), args.max_ingredient)
+        elif args.path.endswith(".csv"):
+            recipes = read_csv(args.path)
+        else:
+            recipes = read_jsonl(args.path)
+
+        for batch in batched(recipes, args.batch):
+            async with sessionmanager.scoped_session("import") as session:
+                try:
+                    await copy_batch(session, batch, tag_ids)
+                    await session.commit()
+                    imported += len(batch)
+                    authors.update(int(recipe["author_id"]) for recipe in batch)
+                except Exception as e:
+                    await session.rollback()
+                    failed += len(batch)
+                    print(f"Пакет пропущен: {e}")
+
+            rate = imported / (time.monotonic() - started)
+            print(f"Импортировано {imported}, пропущено {failed}, {rate:.0f} рецептов/с")
+
+        if authors:
+            async with sessionmanager.scoped_session("import") as session:
+                recipes_count = (
+                    select(func.count(Recipe.id))
+                    .where(Recipe.author_id == User.id)
+                    .scalar_subquery()
+                )
+                await session.execute(
+                    update(User).where(User.id.in_(authors)).values(recipes_count=recipes_count)
+                )
+                await session.commit()
+
+            await CountManager(Recipe).invalidate()
+            await recipe_cache.invalidate("recipe_list")
+
+        print("== Успех! Ингредиенты будут отправлены диспетчером outbox бэкенда. ==")
+
+    finally:
+        await db_redis.close(close_connection_pool=True)
+        await sessionmanager.close("import")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Массовый импорт рецептов через COPY.")
+    parser.add_argument("path", nargs="?", help="Файл .jsonl или .csv")
+    parser.add_argument(
+        "--generate", type=int, default=0, help="Сгенерировать N случайных рецептов"
+    )
+    parser.add_argument("--author", type=int, default=1, help="Автор сгенерированных рецептов")
+    parser.add_argument(
+        "--max-ingredient", type=int, default=2186, help="Максимальный id ингредиента"
+    )
+    parser.add_argument("--batch", type=int, default=10000, help="Рецептов в одной транзакции")
+    arguments = parser.parse_args()
+    if not arguments.path and not arguments.generate:
+        parser.error("нужен путь к файлу или --generate")
+
+    asyncio.run(async_main(arguments))
@@ -1,13 +1,14 @@
 # flake8: noqa: F401
-"""Загружает данные в таблицу из файла json."""
+"""Загружает данные в таблицу из файла json.
+Повторный запуск с обновленным файлом добавляет новые и обновляет измененные теги по `slug`."""
 import asyncio
 import json
 import os
 
 import __init__
 
-from application.database import sessionmanager
-from application.managers import Manager
+from application.database import db_redis, sessionmanager
+from application.managers import CachedManager
 from application.settings import DATA_ROOT, settings
 from application.tags.models import Tag
 
@@ -16,17 +17,18 @@ async def async_main() -> None:
     try:
         sessionmanager.init(settings.SQLALCHEMY_DATABASE_URI, "tags")
         with open(os.path.join(DATA_ROOT, "tags.json"), encoding="utf-8") as file:
-            items = dict((item["name"], item) for item in json.load(file)).values()
-            for item in items:
-                await Manager(Tag, "tags").create(item)
+            manager = CachedManager(Tag, "tags")
+            inserted, updated, skipped = await manager.upsert(json.load(file), ["slug"])
+            await manager.invalidate()
 
-        print("== Успех! ==")
+        print(f"== Успех! Добавлено {inserted}, обновлено {updated}, без изменений {skipped} ==")
 
-    except TypeError:
+    except FileNotFoundError:
         print("Файл <tags.json> отсутствует в каталоге data")
     except Exception as e:
         print(f"Ошибка: {e}")
     finally:
+        await db_redis.close(close_connection_pool=True)
         await sessionmanager.close("tags")
 
 
@@ -0,0 +1,46 @@
+# flake8: noqa: F401
+""" Пересчитывает счетчики избранного, подписчиков и рецептов по фактическим данным. """
+
+import asyncio
+
+import __init__
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from application.database import sessionmanager
+from application.recipes.models import Favorite, Recipe
+from application.settings import settings
+from application.tags.models import recipe_tag
+from application.users.models import Follow, User
+
+
+async def recount(session: AsyncSession) -> None:
+    counters = (
+        (Recipe, Recipe.favorites_count, Favorite.recipe_id),
+        (User, User.followers_count, Follow.author_id),
+        (User, User.recipes_count, Recipe.author_id),
+    )
+    for model, column, foreign_key in counters:
+        actual = (
+            select(func.count())
+            .select_from(foreign_key.table)
+            .where(foreign_key == model.id)
+            .scalar_subquery()
+        )
+        query = await session.execute(
+            update(model).where(column != actual).values({column.key: actual}).returning(model.id)
+        )
+        print(f"{model.__tablename__}.{column.key}: исправлено {len(query.all())}")
+
+
+async def async_main() -> None:
+    sessionmanager.init(settings.SQLALCHEMY_DATABASE_URI, "recount")
+    async with sessionmanager.scoped_session("recount") as session:
+        await recount(session)
+        await session.commit()
+
+    await sessionmanager.close("recount")
+
+
+if __name__ == "__main__":
+    asyncio.run(async_main())
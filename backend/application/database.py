@@ -1,9 +1,11 @@
 import re
 from asyncio import current_task
 from contextlib import asynccontextmanager
+from time import perf_counter
 from typing import Any, AsyncGenerator
+from uuid import uuid4
 
-from redis import Redis
+from redis.asyncio import BlockingConnectionPool, Redis
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
     AsyncEngine,
@@ -13,6 +15,7 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 from sqlalchemy.orm import declarative_base, declared_attr
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
 from application.settings import settings
 
@@ -38,13 +41,52 @@ class CustomBase:
 Base = declarative_base(cls=CustomBase)
 
 
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, который считает выдачи соединений и суммарное время их получения."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkouts += 1
+            self.wait_seconds += perf_counter() - start
+
+
 class DatabaseSessionManager:
     def __init__(self) -> None:
         self._engine: dict[str, AsyncEngine | None] = {}
         self._sessionmaker: dict[str, async_sessionmaker | None] = {}
 
     def init(self, host: str, schema_name: str | None = settings.SCHEMA_NAME) -> None:
-        self._engine[schema_name]: AsyncEngine = create_async_engine(host, pool_pre_ping=True)
+        """
+        Параметры пула берутся из настроек `POSTGRES_POOL_*`. В режиме `POSTGRES_PGBOUNCER`
+        (transaction pooling) кэш подготовленных выражений отключен, а их имена уникальны,
+        так как соседние запросы могут попасть на разные серверные соединения.
+        """
+        cache_size = 0 if settings.POSTGRES_PGBOUNCER else settings.POSTGRES_STATEMENT_CACHE_SIZE
+        connect_args: dict[str, Any] = {
+            "statement_cache_size": cache_size,
+            "prepared_statement_cache_size": cache_size,
+        }
+        if settings.POSTGRES_PGBOUNCER:
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+
+        self._engine[schema_name]: AsyncEngine = create_async_engine(
+            host,
+            poolclass=TimedQueuePool,
+            pool_size=settings.POSTGRES_POOL_SIZE,
+            max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+            pool_recycle=settings.POSTGRES_POOL_RECYCLE,
+            pool_timeout=settings.POSTGRES_POOL_TIMEOUT,
+            pool_pre_ping=settings.POSTGRES_POOL_PRE_PING,
+            connect_args=connect_args,
+        )
         self._sessionmaker[schema_name]: async_sessionmaker[AsyncSession] = async_sessionmaker(
             self._engine[schema_name],
             autocommit=False,
@@ -59,6 +101,20 @@ class DatabaseSessionManager:
         self._engine.pop(schema_name, None)
         self._sessionmaker.pop(schema_name, None)
 
+    def pool_status(self) -> dict[str, dict[str, float]]:
+        """Состояние пула каждого движка по имени схемы для `/metrics`."""
+        return {
+            schema_name: {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "checkouts": pool.checkouts,
+                "wait_seconds": pool.wait_seconds,
+            }
+            for schema_name, engine in self._engine.items()
+            if engine is not None and isinstance(pool := engine.pool, TimedQueuePool)
+        }
+
     @asynccontextmanager
     async def connect(self, schema_name: str | None = settings.SCHEMA_NAME) -> ASession:
         if not self._engine.get(schema_name, None):
@@ -99,8 +155,13 @@ class DatabaseSessionManager:
 sessionmanager = DatabaseSessionManager()
 scoped_session = sessionmanager.scoped_session
 
-db_redis: Redis = Redis.from_url(
-    settings.REDIS_URL,
-    password=settings.REDIS_PASSWORD,
-    decode_responses=True,
+db_redis: Redis = Redis(
+    connection_pool=BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        password=settings.REDIS_PASSWORD,
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    )
 )
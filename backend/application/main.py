@@ -1,4 +1,5 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from os.path import isdir
 
 from debug_toolbar.middleware import DebugToolbarMiddleware
@@ -11,15 +12,25 @@ from sqlalchemy.sql.schema import MetaData
 from starlette.middleware.authentication import AuthenticationMiddleware
 from starlette.requests import Request
 
+from application.auth.managers import AuthTokenRedisManager
 from application.auth.permissions import AuthBackend
-from application.database import Base, sessionmanager
+from application.database import Base, db_redis, sessionmanager
 from application.exceptions import CustomException
+from application.metrics import MetricsMiddleware
+from application.metrics import router as metrics_router
+from application.metrics import sample_pool_periodically
+from application.recipes.images import image_executor
+from application.recipes.managers import outbox
+from application.recipes.utils import sweep_uploads_periodically
 from application.routers import router
+from application.services import httpclient
 from application.settings import MEDIA_ROOT, settings
+from application.timing import QueryTimingMiddleware
 
 
 def init_routers(app_: FastAPI) -> None:
     app_.include_router(router, prefix=settings.API_V1_STR)
+    app_.include_router(metrics_router)
 
 
 def init_listeners(app_: FastAPI) -> None:
@@ -46,6 +57,8 @@ def on_auth_error(request: Request, exc: Exception) -> JSONResponse:
 
 def make_middleware() -> list[Middleware]:
     middleware = [
+        Middleware(QueryTimingMiddleware),
+        Middleware(MetricsMiddleware),
         Middleware(
             CORSMiddleware,
             allow_origins=settings.BACKEND_CORS_ORIGINS,
@@ -58,24 +71,42 @@ def make_middleware() -> list[Middleware]:
             backend=AuthBackend(),
             on_error=on_auth_error,
         ),
-        Middleware(
-            DebugToolbarMiddleware,
-            panels=["debug_toolbar.panels.sqlalchemy.SQLAlchemyPanel"],
-        ),
     ]
+    if settings.DEBUG_TOOLBAR:
+        middleware.append(
+            Middleware(
+                DebugToolbarMiddleware,
+                panels=["debug_toolbar.panels.sqlalchemy.SQLAlchemyPanel"],
+            )
+        )
     return middleware
 
 
 def create_app(init_db: bool | None = True) -> FastAPI:
-    lifespan = None
     if init_db:
         sessionmanager.init(settings.SQLALCHEMY_DATABASE_URI)
 
-        @asynccontextmanager
-        async def lifespan(app_: FastAPI):
-            yield
-            if sessionmanager._engine is not None:
-                await sessionmanager.close()
+    @asynccontextmanager
+    async def lifespan(app_: FastAPI):
+        httpclient.init(settings.INGREDIENTS_URL)
+        image_executor.init()
+        listeners = [
+            asyncio.create_task(AuthTokenRedisManager.listen_invalidation()),
+            asyncio.create_task(sample_pool_periodically()),
+            asyncio.create_task(sweep_uploads_periodically()),
+        ]
+        if init_db:
+            listeners.append(asyncio.create_task(outbox.run()))
+        yield
+        for listener in listeners:
+            listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await listener
+        await httpclient.close()
+        image_executor.shutdown()
+        await db_redis.close(close_connection_pool=True)
+        if init_db and sessionmanager._engine is not None:
+            await sessionmanager.close()
 
     app_ = FastAPI(
         debug=False,
@@ -1,12 +1,16 @@
+import json
 import logging
 from datetime import datetime
-from typing import Generic, Sequence, TypeVar
+from typing import Any, Generic, TypeVar
 
 from asyncpg.exceptions import UniqueViolationError
-from sqlalchemy import delete, insert, select, update
+from redis.exceptions import RedisError
+from sqlalchemy import Boolean, Select, delete, insert, literal_column, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from application.database import scoped_session
-from application.schemas import Params
+from application.database import db_redis, scoped_session
+from application.schemas import Params, SearchName
 from application.settings import settings
 
 _TM = TypeVar("_TM")
@@ -58,7 +62,7 @@ class Manager(BaseManager):
 
     async def get_all(
         self,
-        params: Sequence[_TS],
+        params: SearchName,
         attr_name: str,
         query_in: list | None = None,
     ) -> tuple[int, list[_TM]]:
@@ -70,14 +74,14 @@ class Manager(BaseManager):
 
     async def get_all_list(
         self,
-        params: Sequence[_TS],
+        params: SearchName,
         attr_name: str,
         query_in: list | None = None,
     ) -> list:
         async with scoped_session(self.schema_name) as session:
             query = await params.search(select(*query_in), attr_name, self.model)
-            query = await session.execute(await params.limit_offset(query))
-            return query.all()
+            result = await session.execute(await params.limit_offset(query))
+            return list(result.all())
 
     async def update(self, items: dict, pk: int) -> _TM | None:
         async with scoped_session(self.schema_name) as session:
@@ -106,3 +110,200 @@ class Manager(BaseManager):
                 await session.rollback()
                 logger.error(e)
                 return False
+
+    async def upsert(
+        self, items: list[dict], index_elements: list[str], chunk_size: int = 1000
+    ) -> tuple[int, int, int]:
+        """
+        Загружает строки пачками `INSERT ... ON CONFLICT DO UPDATE` по уникальному полю.
+        Совпадающие строки не перезаписываются. Возвращает количество добавленных,
+        обновленных и пропущенных строк.
+        """
+        rows = list({tuple(item[key] for key in index_elements): item for item in items}.values())
+        inserted = updated = 0
+        async with scoped_session(self.schema_name) as session:
+            for start in range(0, len(rows), chunk_size):
+                insert_query = pg_insert(self.model).values(rows[start : start + chunk_size])
+                columns = [key for key in rows[0] if key not in index_elements]
+                query = insert_query.on_conflict_do_update(
+                    index_elements=index_elements,
+                    set_={
+                        **{key: insert_query.excluded[key] for key in columns},
+                        "updated_at": datetime.utcnow(),
+                    },
+                    where=tuple_(
+                        *(self.model.__table__.c[key] for key in columns)
+                    ).is_distinct_from(tuple_(*(insert_query.excluded[key] for key in columns))),
+                ).returning(literal_column("xmax = 0", Boolean))
+                for (is_inserted,) in await session.execute(query):
+                    inserted += is_inserted
+                    updated += not is_inserted
+            await session.commit()
+
+        return inserted, updated, len(rows) - inserted - updated
+
+
+class CachedManager(Manager):
+    """
+    `Manager` с read-through кэшем в Redis для редко изменяемых справочников.
+    Списки и объекты по id хранятся в hash `catalog:{table}`,
+    который удаляется при любом изменении через `create`, `update` или `delete`.
+
+    .. code-block:: python
+        your_variable = CachedManager(YourModel)
+    """
+
+    @property
+    def cache_key(self) -> str:
+        return f"catalog:{self.model.__tablename__}"
+
+    async def _get_cached(self, field: str) -> Any | None:
+        try:
+            if (cached := await db_redis.hget(self.cache_key, field)) is not None:
+                return json.loads(cached)
+        except RedisError as e:
+            logger.error(e)
+        return None
+
+    async def _set_cached(self, field: str, value: Any) -> None:
+        try:
+            async with db_redis.pipeline(transaction=True) as pipe:
+                await (
+                    pipe.hset(self.cache_key, field, json.dumps(value, default=str))
+                    .expire(self.cache_key, settings.CATALOG_CACHE_TTL)
+                    .execute()
+                )
+        except RedisError as e:
+            logger.error(e)
+
+    async def invalidate(self) -> None:
+        try:
+            await db_redis.delete(self.cache_key)
+        except RedisError as e:
+            logger.error(e)
+
+    async def by_id(self, pk: int) -> Any:
+        field = f"id:{pk}"
+        if (cached := await self._get_cached(field)) is not None:
+            return cached
+
+        async with scoped_session(self.schema_name) as session:
+            query = await session.execute(
+                select(*self.model.__table__.columns).where(self.model.id == pk)
+            )
+            if (row := query.one_or_none()) is None:
+                return None
+        result = row._asdict()
+        await self._set_cached(field, result)
+        return result
+
+    async def ids_by(self, attr_name: str) -> dict[str, int]:
+        """Соответствие значений уникального поля и id, например `slug` -> `id` для фильтров."""
+        field = f"ids:{attr_name}"
+        if (cached := await self._get_cached(field)) is not None:
+            return cached
+
+        async with scoped_session(self.schema_name) as session:
+            query = await session.execute(select(getattr(self.model, attr_name), self.model.id))
+            result = {str(key): pk for key, pk in query.all()}
+        await self._set_cached(field, result)
+        return result
+
+    async def get_all_list(
+        self,
+        params: SearchName,
+        attr_name: str,
+        query_in: list | None = None,
+    ) -> list:
+        columns = ",".join(column.key for column in query_in or [])
+        field = f"list:{attr_name}:{columns}:{params.cache_key}"
+        if (cached := await self._get_cached(field)) is not None:
+            return cached
+
+        result = await super().get_all_list(params, attr_name, query_in)
+        await self._set_cached(field, [row._asdict() for row in result])
+        return result
+
+    async def create(self, items: dict) -> Any:
+        try:
+            return await super().create(items)
+        finally:
+            await self.invalidate()
+
+    async def update(self, items: dict, pk: int) -> Any:
+        try:
+            return await super().update(items, pk)
+        finally:
+            await self.invalidate()
+
+    async def delete(self, pk: int) -> bool:
+        try:
+            return await super().delete(pk)
+        finally:
+            await self.invalidate()
+
+
+class CountManager(BaseManager):
+    """
+    Общее количество объектов для пагинации по стратегии `settings.COUNT_STRATEGY`.
+
+    * `exact` - всегда выполняет `COUNT`.
+    * `cached` - результат `COUNT` хранится в Redis по нормализованным фильтрам
+      до вызова `invalidate` (создание/удаление объектов) или `COUNT_CACHE_TTL`.
+    * `estimate` - для списков без фильтров берет оценку планировщика `pg_class.reltuples`,
+      для списков с фильтрами работает как `cached`.
+
+    .. code-block:: python
+
+        count = await CountManager(YourModel).count(session, count_query, params)
+    """
+
+    @property
+    def cache_key(self) -> str:
+        return f"count:{self.model.__tablename__}"
+
+    async def count(
+        self,
+        session: AsyncSession,
+        query: Select,
+        params: _TS,
+        filtered: bool = True,
+        cacheable: bool = True,
+    ) -> int:
+        strategy = settings.COUNT_STRATEGY
+        if strategy == "exact" or not cacheable:
+            return await session.scalar(query)
+
+        if strategy == "estimate" and not filtered:
+            if (estimate := await self.estimate(session)) > 0:
+                return estimate
+
+        try:
+            if (cached := await db_redis.hget(self.cache_key, params.count_key)) is not None:
+                return int(cached)
+
+            count = await session.scalar(query)
+            async with db_redis.pipeline(transaction=True) as pipe:
+                await (
+                    pipe.hset(self.cache_key, params.count_key, count)
+                    .expire(self.cache_key, settings.COUNT_CACHE_TTL)
+                    .execute()
+                )
+            return count
+
+        except RedisError as e:
+            logger.error(e)
+            return await session.scalar(query)
+
+    async def estimate(self, session: AsyncSession) -> int:
+        """Оценка количества строк таблицы по статистике планировщика, -1 если ее еще нет."""
+        return await session.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:name AS regclass)"),
+            {"name": f'"{self.model.__tablename__}"'},
+        )
+
+    async def invalidate(self) -> None:
+        try:
+            await db_redis.delete(self.cache_key)
+        except RedisError as e:
+            logger.error(e)
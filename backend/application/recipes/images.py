@@ -0,0 +1,126 @@
+"""
+Уменьшенные копии картинок рецептов.
+
+Картинка обрабатывается после ответа на запрос в пуле процессов `image_executor`:
+из оригинала удаляются метаданные с учетом поворота из EXIF, для каждого размера
+`IMAGE_SIZES` рядом с оригиналом сохраняются копии в форматах `IMAGE_FORMATS`.
+Имена копий записываются в `Recipe.image_variants`, до этого клиенты получают только оригинал.
+
+.. code-block:: python
+
+    background_tasks.add_task(process_image, recipe_id, filename)
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from PIL import Image, ImageOps, features
+from sqlalchemy import update
+
+from application.cache import recipe_cache
+from application.database import scoped_session
+from application.recipes.models import Recipe
+from application.services import image_delete
+from application.settings import MEDIA_ROOT, settings
+
+logger = logging.getLogger(__name__)
+
+
+class ImageExecutorManager:
+    """
+    Пул процессов для обработки картинок, создается в `lifespan` приложения
+    и закрывается при его остановке. Процессы запускаются через `spawn`,
+    чтобы не наследовать от воркера соединения, потоки и цикл событий.
+
+    .. code-block:: python
+
+        image_executor.init()
+        await loop.run_in_executor(image_executor.executor, render_variants, filename)
+        image_executor.shutdown()
+    """
+
+    def __init__(self) -> None:
+        self._executor: ProcessPoolExecutor | None = None
+
+    def init(self) -> None:
+        self._executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_MAX_WORKERS, mp_context=get_context("spawn")
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is None:
+            raise Exception("ImageExecutorManager is not initialized")
+
+        self._executor.shutdown()
+        self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            raise Exception("ImageExecutorManager is not initialized")
+        return self._executor
+
+
+image_executor = ImageExecutorManager()
+
+
+def render_variants(filename: str) -> dict[str, dict[str, str]]:
+    """Выполняется в процессе пула, возвращает `{размер: {формат: имя файла}}`."""
+    path = os.path.join(MEDIA_ROOT, filename)
+    stem = os.path.splitext(filename)[0]
+
+    with Image.open(path) as original:
+        image_format = original.format
+        animated = getattr(original, "is_animated", False)
+        image = ImageOps.exif_transpose(original)
+
+    icc_profile = image.info.get("icc_profile")
+    transparency = image.info.get("transparency")
+    image.info = {} if transparency is None else {"transparency": transparency}
+    if not animated:
+        image.save(f"{path}.tmp", format=image_format, quality=95, icc_profile=icc_profile)
+        os.replace(f"{path}.tmp", path)
+
+    image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    variants: dict[str, dict[str, str]] = {}
+    for size_name, size in settings.IMAGE_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for image_format in settings.IMAGE_FORMATS:
+            if not features.check(image_format):
+                continue
+            variant = f"{stem}_{size_name}.{image_format}"
+            thumbnail.save(
+                os.path.join(MEDIA_ROOT, variant),
+                quality=settings.IMAGE_QUALITY,
+                icc_profile=icc_profile,
+            )
+            variants.setdefault(size_name, {})[image_format] = variant
+    return variants
+
+
+async def process_image(recipe_id: int, filename: str) -> None:
+    """Сохраняет копии, только если картинка рецепта не была заменена за время обработки."""
+    loop = asyncio.get_running_loop()
+    try:
+        variants = await loop.run_in_executor(image_executor.executor, render_variants, filename)
+    except Exception as e:
+        logger.error(e)
+        return
+
+    async with scoped_session() as session:
+        updated = await session.scalar(
+            update(Recipe)
+            .where(Recipe.id == recipe_id, Recipe.image == filename)
+            .values(image_variants=variants)
+            .returning(Recipe.id)
+        )
+        await session.commit()
+
+    if updated is not None:
+        await recipe_cache.invalidate("recipe_list", f"recipe:{recipe_id}")
+    else:
+        await image_delete(filename)
@@ -1,149 +1,390 @@
+import asyncio
 import logging
-from datetime import datetime
+from contextlib import suppress
+from datetime import datetime, timedelta
 
-from asyncpg.exceptions import UniqueViolationError
-from sqlalchemy import Result, delete, insert, select, update
+from sqlalchemy import (
+    ColumnElement,
+    Result,
+    Row,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql import func
 from starlette.requests import Request
 
+from application.cache import recipe_cache
 from application.database import scoped_session
-from application.managers import BaseManager
-from application.recipes.models import Cart, Favorite, Recipe
-from application.recipes.schemas import CreateRecipe, FavoriteOut, RecipeOut, UpdateRecipe
+from application.exceptions import BadRequestException, CustomException
+from application.managers import BaseManager, CachedManager, CountManager
+from application.recipes.models import Cart, Favorite, IngredientOutbox, Recipe
+from application.recipes.schemas import (
+    CreateAmountIngredient,
+    CreateRecipe,
+    RecipeOut,
+    UpdateRecipe,
+)
 from application.schemas import SearchRecipe
 from application.services import (
-    delete_is_ingredients,
+    get_bulk_ingredients,
     get_is_ingredients,
     get_shopping_cart,
-    post_is_ingredients,
-    update_is_ingredients,
+    lookup_ingredients,
+    post_batch_ingredients,
 )
+from application.settings import settings
 from application.tags.models import Tag, recipe_tag
-from application.users.managers import UserManager
-from application.users.models import User
+from application.users.models import Follow, User
 
 logger = logging.getLogger(__name__)
 
+tag_manager = CachedManager(Tag)
+
+
+class OutboxDispatcher:
+    """
+    Доставляет `IngredientOutbox` в сервис ингредиентов пакетами в порядке записи.
+    Запускается в `lifespan` каждого воркера, пакет берет тот, кто взял advisory lock,
+    и откладывает его на время отправки, не держа транзакцию открытой. Из нескольких
+    изменений одного рецепта в пакете отправляется последнее. Недоставленный пакет
+    повторяется с экспоненциальной задержкой, ключ идемпотентности защищает
+    от повторного применения уже принятого пакета.
+    Отклоненные сервисом изменения остаются в таблице с `rejected_at` до следующего
+    принятого изменения того же рецепта, их список доступен администратору.
+    """
+
+    LOCK_ID = 7_300_417
+
+    def __init__(self) -> None:
+        self._wakeup = asyncio.Event()
+
+    @staticmethod
+    async def enqueue(session: AsyncSession, recipe_id: int, ingredients: list | None) -> None:
+        await session.execute(
+            insert(IngredientOutbox).values(recipe_id=recipe_id, ingredients=ingredients)
+        )
+
+    def notify(self) -> None:
+        """Будит диспетчер этого воркера сразу после коммита, не дожидаясь опроса."""
+        self._wakeup.set()
+
+    async def _claim(self) -> list:
+        """Берет пакет и откладывает его на время отправки в короткой транзакции:
+        пока сервис отвечает, соединение возвращено в пул, а другие воркеры пакет не берут."""
+        async with scoped_session() as session:
+            if not await session.scalar(select(func.pg_try_advisory_xact_lock(self.LOCK_ID))):
+                return []
+
+            query = await session.execute(
+                select(
+                    IngredientOutbox.id,
+                    IngredientOutbox.recipe_id,
+                    IngredientOutbox.ingredients,
+                    IngredientOutbox.attempts,
+                    IngredientOutbox.available_at,
+                )
+                .where(IngredientOutbox.rejected_at.is_(None))
+                .order_by(IngredientOutbox.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+            )
+            rows = list(query.all())
+            if not rows or rows[0].available_at > datetime.utcnow():
+                return []
+
+            await session.execute(
+                update(IngredientOutbox)
+                .where(IngredientOutbox.id.in_([row.id for row in rows]))
+                .values(
+                    available_at=datetime.utcnow()
+                    + timedelta(seconds=2 * settings.INGREDIENTS_TIMEOUT)
+                )
+            )
+            await session.commit()
+            return rows
+
+    async def dispatch(self) -> int:
+        rows = await self._claim()
+        if not rows:
+            return 0
+
+        ids = [row.id for row in rows]
+        latest = {row.recipe_id: row.ingredients for row in rows}
+        try:
+            rejected = await asyncio.wait_for(
+                post_batch_ingredients(
+                    [{"id": pk, "ingredients": ingredients} for pk, ingredients in latest.items()],
+                    f"outbox:{ids[0]}-{ids[-1]}",
+                ),
+                settings.INGREDIENTS_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            rejected = None
+
+        async with scoped_session() as session:
+            if rejected is None:
+                delay = min(2 ** rows[0].attempts, settings.OUTBOX_MAX_BACKOFF)
+                await session.execute(
+                    update(IngredientOutbox)
+                    .where(IngredientOutbox.id.in_(ids))
+                    .values(
+                        attempts=IngredientOutbox.attempts + 1,
+                        available_at=datetime.utcnow() + timedelta(seconds=delay),
+                    )
+                )
+                await session.commit()
+                logger.error(f"Сервис ингредиентов недоступен, повтор через {delay} с.")
+                return 0
+
+            accepted = [pk for pk in latest if pk not in rejected]
+            await session.execute(
+                delete(IngredientOutbox).where(
+                    IngredientOutbox.recipe_id.in_(accepted) & (IngredientOutbox.id <= ids[-1])
+                )
+            )
+            await session.execute(
+                update(IngredientOutbox)
+                .where(
+                    IngredientOutbox.id.in_(ids),
+                    IngredientOutbox.recipe_id.in_(rejected),
+                )
+                .values(rejected_at=datetime.utcnow())
+            )
+            await session.commit()
+
+        if rejected:
+            logger.error(f"Сервис ингредиентов отклонил ингредиенты рецептов {rejected}")
+        await recipe_cache.invalidate("recipe_list", *(f"recipe:{pk}" for pk in latest))
+        return len(ids)
+
+    @staticmethod
+    async def rejected() -> list[IngredientOutbox]:
+        async with scoped_session() as session:
+            query = await session.execute(
+                select(IngredientOutbox)
+                .where(IngredientOutbox.rejected_at.is_not(None))
+                .order_by(IngredientOutbox.id)
+            )
+            return list(query.scalars())
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.dispatch() >= settings.OUTBOX_BATCH_SIZE:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(e)
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), settings.OUTBOX_POLL_INTERVAL)
+
+
+outbox = OutboxDispatcher()
+
 
 class RecipeManager:
+    @staticmethod
+    async def _recipes_count(session: AsyncSession, author_id: int, delta: int) -> None:
+        await session.execute(
+            update(User)
+            .where(User.id == author_id)
+            .values(recipes_count=User.recipes_count + delta)
+        )
+
     @staticmethod
     async def _create_recipe_tag(session: AsyncSession, tags: list) -> Result:
         return await session.execute(insert(recipe_tag).values(tags))
 
     @staticmethod
-    async def session_is_favorited(
+    async def session_is_favorited_cart(
         session: AsyncSession,
-        recipe_id: int,
-        user_id: int,
-    ) -> int | None:
+        recipe_ids: list[int],
+        user_id: int | None = None,
+    ) -> tuple[set[int], set[int]]:
+        """Одним запросом возвращает id рецептов из `recipe_ids`,
+        которые находятся в избранном и в списке покупок пользователя."""
+        if not user_id or not recipe_ids:
+            return set(), set()
+
         query = await session.execute(
-            select(Favorite.id).where(
-                Favorite.recipe_id == recipe_id,
-                Favorite.user_id == user_id,
+            union_all(
+                select(Favorite.recipe_id, literal("favorite").label("kind")).where(
+                    Favorite.user_id == user_id,
+                    Favorite.recipe_id.in_(recipe_ids),
+                ),
+                select(Cart.recipe_id, literal("cart").label("kind")).where(
+                    Cart.user_id == user_id,
+                    Cart.recipe_id.in_(recipe_ids),
+                ),
             )
         )
-        return query.one_or_none()
+        favorited: set[int] = set()
+        in_cart: set[int] = set()
+        for recipe_id, kind in query.all():
+            (favorited if kind == "favorite" else in_cart).add(recipe_id)
+        return favorited, in_cart
 
     @staticmethod
-    async def session_is_cart(session: AsyncSession, recipe_id: int, user_id: int) -> int | None:
-        query = await session.execute(
-            select(Cart.id).where(
-                Cart.recipe_id == recipe_id,
-                Cart.user_id == user_id,
-            )
-        )
-        return query.one_or_none()
+    async def check_ingredients(ingredients: list[CreateAmountIngredient]) -> list[dict]:
+        """Проверяет ингредиенты рецепта в сервисе ингредиентов до записи в `IngredientOutbox`
+        и возвращает их в формате `AmountOut`."""
+        ingredient_ids = [items.id for items in ingredients]
+        existing = await lookup_ingredients(ingredient_ids)
+        if existing is None:
+            raise CustomException("Сервис ингредиентов недоступен")
+        if unknown := [pk for pk in ingredient_ids if pk not in existing]:
+            raise BadRequestException(f"Ингредиенты не существуют: {unknown}")
+        return [{**existing[items.id], "amount": items.amount} for items in ingredients]
 
     async def create(self, items: dict, recipe_in: CreateRecipe) -> int | None:
+        """Рецепт, теги и запись `IngredientOutbox` сохраняются одной локальной транзакцией,
+        ингредиенты доставляет `outbox` после коммита."""
         async with scoped_session() as session:
             try:
-                recipe_id = await session.scalar(
-                    insert(Recipe).values(**items).returning(Recipe.id)
-                )
+                query = await session.execute(insert(Recipe).values(**items).returning(Recipe.id))
+                recipe_id = query.scalar_one()
                 await self._create_recipe_tag(session, await recipe_in.tags_to_list(recipe_id))
-                if await post_is_ingredients(
-                    {
-                        "id": recipe_id,
-                        "ingredients": await recipe_in.ingredients_to_list(recipe_id),
-                    }
-                ):
-                    await session.commit()
-                    return recipe_id
-                raise AttributeError
-
-            except (UniqueViolationError, AttributeError) as e:
+                await self._recipes_count(session, items["author_id"], 1)
+                await outbox.enqueue(
+                    session, recipe_id, await recipe_in.ingredients_to_list(recipe_id)
+                )
+                await session.commit()
+
+            except Exception as e:
                 await session.rollback()
-                await delete_is_ingredients(recipe_id)
                 logger.error(e)
                 return None
 
+        outbox.notify()
+        await CountManager(Recipe).invalidate()
+        await recipe_cache.invalidate("recipe_list")
+        return recipe_id
+
+    async def delete(self, pk: int, author_id: int) -> bool:
+        async with scoped_session() as session:
+            deleted = await session.scalar(
+                delete(Recipe).where(Recipe.id == pk).returning(Recipe.id)
+            )
+            if deleted is None:
+                return False
+            await self._recipes_count(session, author_id, -1)
+            await outbox.enqueue(session, pk, None)
+            await session.commit()
+
+        outbox.notify()
+        return True
+
     async def update(self, pk: int, items: dict, recipe_in: UpdateRecipe) -> int | None:
         async with scoped_session() as session:
             try:
-                recipe_id = await session.scalar(
+                query = await session.execute(
                     update(Recipe)
                     .values(**items, updated_at=datetime.utcnow())
                     .where(Recipe.id == pk)
                     .returning(Recipe.id)
                 )
-                await session.execute(delete(recipe_tag).where(recipe_tag.c.recipe_id == pk))
-                await self._create_recipe_tag(session, await recipe_in.tags_to_list(recipe_id))
-
-                if await update_is_ingredients(
-                    {"id": recipe_id, "ingredients": await recipe_in.ingredients_to_list(recipe_id)}
-                ):
-                    await session.commit()
-                    return recipe_id
-                raise AttributeError
+                recipe_id = query.scalar_one()
+                if recipe_in.tags is not None:
+                    await session.execute(delete(recipe_tag).where(recipe_tag.c.recipe_id == pk))
+                    await self._create_recipe_tag(session, await recipe_in.tags_to_list(recipe_id))
+                if recipe_in.ingredients is not None:
+                    await outbox.enqueue(
+                        session, recipe_id, await recipe_in.ingredients_to_list(recipe_id)
+                    )
+                await session.commit()
 
             except Exception as e:
                 await session.rollback()
                 logger.error(e)
                 return None
 
-    async def author_by_id(self, pk: int) -> int:
+        outbox.notify()
+        await CountManager(Recipe).invalidate()
+        await recipe_cache.invalidate("recipe_list", f"recipe:{pk}")
+        return recipe_id
+
+    async def author_by_id(self, pk: int) -> int | None:
         async with scoped_session() as session:
             query = await session.execute(select(Recipe.author_id).where(Recipe.id == pk))
-            return query.one()
+            return query.scalar_one_or_none()
 
-    async def get(self, request: Request, pk: int) -> dict:
+    async def get(self, request: Request, pk: int, ingredients: list | None = None) -> dict:
+        """Рецепт вместе с автором, подпиской, избранным и списком покупок одним запросом.
+        Ингредиенты запрашиваются у сервиса ингредиентов параллельно с запросом в БД,
+        если не переданы в `ingredients`, например сразу после создания рецепта."""
         async with scoped_session() as session:
             user_id = request.user.id
-            query = await session.execute(
+            statement = (
                 select(
-                    *Recipe.list_columns("id", "name", "text", "cooking_time"),
+                    *Recipe.list_columns(
+                        "id",
+                        "name",
+                        "text",
+                        "cooking_time",
+                        "favorites_count",
+                        "image_variants",
+                    ),
                     Recipe.image_path(request),
-                    Recipe.author_id.label("author"),
+                    User.json_build_object(
+                        "id",
+                        "email",
+                        "username",
+                        "first_name",
+                        "last_name",
+                    ).label("author"),
+                    Follow.exists_subscribed(Recipe.author_id, user_id),
+                    Favorite.exists_favorited(Recipe.id, user_id),
+                    Cart.exists_in_shopping_cart(Recipe.id, user_id),
                     Tag.array_agg("id", "name", "color", "slug").label("tags"),
                 )
+                .join(Recipe.author)
                 .join(Recipe.tags, isouter=True)
                 .where(Recipe.id == pk)
-                .group_by(Recipe.id)
+                .group_by(Recipe.id, User.id)
             )
+            if ingredients is None:
+                query, ingredients = await asyncio.gather(
+                    session.execute(statement), get_is_ingredients(pk)
+                )
+            else:
+                query = await session.execute(statement)
             recipe = query.one_or_none()
 
             if not recipe:
                 return recipe
 
-            recipe_dict = await RecipeOut.to_dict(  # TODO описание проблемы внутри
+            return await RecipeOut.to_dict(
                 recipe,
-                author=await UserManager.session_by_id(session, recipe.author, user_id),
-                is_favorited=await self.session_is_favorited(session, recipe.id, user_id),
-                is_in_shopping_cart=await self.session_is_cart(session, recipe.id, user_id),
+                author={**recipe.author, "is_subscribed": recipe.is_subscribed},
+                is_favorited=recipe.is_favorited,
+                is_in_shopping_cart=recipe.is_in_shopping_cart,
+                ingredients=ingredients or [],
             )
-            if ingredients := await get_is_ingredients(recipe.id):
-                recipe_dict["ingredients"] = ingredients
-                return recipe_dict
 
-            raise AttributeError
-
-    async def get_all(self, request: Request, params: SearchRecipe) -> tuple[int, list]:
+    async def get_all(self, request: Request, params: SearchRecipe) -> tuple[int | None, list]:
         async with scoped_session() as session:
             user_id = request.user.id
             query = (
                 select(
-                    *Recipe.list_columns("id", "name", "text", "cooking_time"),
+                    *Recipe.list_columns(
+                        "id",
+                        "name",
+                        "text",
+                        "cooking_time",
+                        "favorites_count",
+                        "image_variants",
+                        "pub_date",
+                        "created_at",
+                    ),
                     Recipe.image_path(request),
                     User.json_build_object(
                         "id",
@@ -155,96 +396,124 @@ class RecipeManager:
                     Tag.array_agg("id", "name", "color", "slug").label("tags"),
                 )
                 .join(Recipe.author)
+                .join(Recipe.tags, isouter=True)
                 .group_by(Recipe.id, User.id)
-                .order_by(Recipe.pub_date.desc(), Recipe.created_at.desc())
+                .order_by(Recipe.pub_date.desc(), Recipe.created_at.desc(), Recipe.id.desc())
             )
-            count, query = await params.search(query)
+            count_query, query = await params.search(query)
 
-            if user_id and not params.is_favorited:
-                count, query = [
-                    row.join(Recipe.favorites, isouter=params.is_favorited).where(
-                        Favorite.user_id == user_id
-                    )
-                    for row in (count, query)
-                ]
-                query = query.group_by(Favorite.user_id)
-            if user_id and not params.is_in_shopping_cart:
-                count, query = [
-                    row.join(Recipe.carts, isouter=params.is_in_shopping_cart).where(
-                        Cart.user_id == user_id
-                    )
-                    for row in (count, query)
-                ]
-                query = query.group_by(Cart.user_id)
-
-            if params.tags:
-                query = (
-                    query.join(Recipe.tags, isouter=True)
-                    .where(Tag.slug.in_(params.tags))
-                    .having(func.count(Tag.slug) == len(params.tags))
-                )
-                count = (
-                    count.join(Recipe.tags, isouter=True)
-                    .where(Tag.slug.in_(params.tags))
-                    .group_by(Tag.slug)
-                    .distinct()
+            filters: list[ColumnElement[bool]] = []
+            if user_id and params.is_favorited:
+                filters.append(
+                    exists().where(Favorite.recipe_id == Recipe.id, Favorite.user_id == user_id)
                 )
+            if user_id and params.is_in_shopping_cart:
+                filters.append(exists().where(Cart.recipe_id == Recipe.id, Cart.user_id == user_id))
+            if params.tags:
+                filters.append(params.tags_filter(await tag_manager.ids_by("slug")))
+            if filters:
+                count_query, query = count_query.where(*filters), query.where(*filters)
 
-            count = await session.scalar(count)
-            if not count:
-                return 0, []
+            count: int | None = None
+            if not params.is_keyset:
+                by_user = bool(user_id) and (params.is_favorited or params.is_in_shopping_cart)
+                count = await CountManager(Recipe).count(
+                    session,
+                    count_query,
+                    params,
+                    filtered=by_user or bool(params.author or params.tags or params.q),
+                    cacheable=not by_user,
+                )
+                if not count:
+                    return 0, []
 
             query = await session.execute(query)
+            recipes = await params.keyset_page(query.all())
+            recipe_ids = [recipe.id for recipe in recipes]
+            (favorited, in_cart), ingredients = await asyncio.gather(
+                self.session_is_favorited_cart(session, recipe_ids, user_id),
+                get_bulk_ingredients(recipe_ids if params.with_ingredients else []),
+            )
             all_recipe = [
                 await RecipeOut.to_dict(  # TODO описание проблемы внутри
                     recipe,
-                    is_favorited=await self.session_is_favorited(session, recipe.id, user_id),
-                    is_in_shopping_cart=await self.session_is_cart(session, recipe.id, user_id),
+                    is_favorited=recipe.id in favorited,
+                    is_in_shopping_cart=recipe.id in in_cart,
+                    ingredients=ingredients.get(recipe.id),
                 )
-                for recipe in query.all()
+                for recipe in recipes
             ]
             return count, all_recipe
 
 
 class FavoriteCartManager(BaseManager):
+    """Избранное и список покупок. Для избранного в той же транзакции
+    обновляется счетчик `Recipe.favorites_count`, а после коммита сбрасываются
+    закэшированные ответы с ним."""
+
+    async def _favorites_count(self, session: AsyncSession, recipe_id: int, delta: int) -> None:
+        if self.model is Favorite:
+            await session.execute(
+                update(Recipe)
+                .where(Recipe.id == recipe_id)
+                .values(favorites_count=Recipe.favorites_count + delta)
+            )
+
+    async def _invalidate(self, recipe_id: int) -> None:
+        if self.model is Favorite:
+            await recipe_cache.invalidate("recipe_list", f"recipe:{recipe_id}")
+
     @staticmethod
     async def get_shopping_cart(user_id: int) -> list:
         async with scoped_session() as session:
             query = await session.execute(select(Cart.recipe_id).where(Cart.user_id == user_id))
-            return await get_shopping_cart(query.scalars().all())
+            if recipe_ids := query.scalars().all():
+                return await get_shopping_cart(recipe_ids)
+            return []
 
-    async def create(self, request: Request, recipe_id: int, user_id: int) -> FavoriteOut | None:
+    async def create(self, request: Request, recipe_id: int, user_id: int) -> Row | None:
         async with scoped_session() as session:
-            recipe = await session.execute(
+            query = await session.execute(
                 select(
-                    Recipe.id, Recipe.name, Recipe.image_path(request), Recipe.cooking_time
+                    Recipe.id,
+                    Recipe.name,
+                    Recipe.image_path(request),
+                    Recipe.image_variants,
+                    Recipe.cooking_time,
                 ).where(Recipe.id == recipe_id)
             )
-            if recipe:
-                try:
-                    await session.execute(
-                        insert(self.model).values(
-                            recipe_id=recipe_id,
-                            user_id=user_id,
-                        )
-                    )
-                    await session.commit()
-                    return recipe.one_or_none()
-                except UniqueViolationError as e:
-                    logger.error(e)
+            if not (recipe := query.one_or_none()):
+                return None
 
-            return None
+            created = await session.scalar(
+                pg_insert(self.model)
+                .values(recipe_id=recipe_id, user_id=user_id)
+                .on_conflict_do_nothing()
+                .returning(self.model.recipe_id)
+            )
+            if created is None:
+                return None
+            await self._favorites_count(session, recipe_id, 1)
+            await session.commit()
+            await self._invalidate(recipe_id)
+            return recipe
 
     async def delete(self, recipe_id: int, user_id: int) -> bool:
         async with scoped_session() as session:
             try:
-                await session.execute(
-                    delete(self.model).where(
+                deleted = await session.scalar(
+                    delete(self.model)
+                    .where(
                         self.model.recipe_id == recipe_id,
                         self.model.user_id == user_id,
                     )
+                    .returning(self.model.recipe_id)
                 )
+                if deleted is None:
+                    return False
+                await self._favorites_count(session, recipe_id, -1)
                 await session.commit()
+                await self._invalidate(recipe_id)
                 return True
             except Exception as e:
                 logger.error(e)
@@ -1,19 +1,22 @@
+from datetime import datetime
 from typing import Any
 
 from sqlalchemy import (
     CheckConstraint,
     Column,
+    Computed,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     UniqueConstraint,
 )
-from sqlalchemy.dialects.postgresql import aggregate_order_by
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import and_, case, func
-from sqlalchemy.sql.expression import Label
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, aggregate_order_by
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.sql import and_, case, exists, false, func
+from sqlalchemy.sql.expression import ColumnElement, Label
 from sqlalchemy.sql.functions import concat
 from starlette.requests import Request
 
@@ -22,6 +25,8 @@ from application.models import TimeStampMixin
 from application.settings import MEDIA_URL
 from application.users.models import User
 
+SEARCH_CONFIG = "russian"
+
 
 class Favorite(Base, TimeStampMixin):
     __table_args__ = (UniqueConstraint("user_id", "recipe_id"),)
@@ -37,6 +42,15 @@ class Favorite(Base, TimeStampMixin):
             else_="False",
         ).label("is_favorited")
 
+    @classmethod
+    def exists_favorited(cls, recipe_id: ColumnElement, user_id: int | None = None) -> Label:
+        """Коррелированный `EXISTS`: находится ли рецепт в избранном пользователя."""
+        if not user_id:
+            return false().label("is_favorited")
+        return (
+            exists().where(cls.recipe_id == recipe_id, cls.user_id == user_id).label("is_favorited")
+        )
+
 
 class Cart(Base, TimeStampMixin):
     __table_args__ = (UniqueConstraint("user_id", "recipe_id"),)
@@ -52,16 +66,50 @@ class Cart(Base, TimeStampMixin):
             else_="False",
         ).label("is_in_shopping_cart")
 
+    @classmethod
+    def exists_in_shopping_cart(cls, recipe_id: ColumnElement, user_id: int | None = None) -> Label:
+        """Коррелированный `EXISTS`: находится ли рецепт в списке покупок пользователя."""
+        if not user_id:
+            return false().label("is_in_shopping_cart")
+        return (
+            exists()
+            .where(cls.recipe_id == recipe_id, cls.user_id == user_id)
+            .label("is_in_shopping_cart")
+        )
+
 
 class Recipe(Base, TimeStampMixin):
-    __table_args__ = (CheckConstraint("cooking_time > 0"),)
+    __table_args__ = (
+        CheckConstraint("cooking_time > 0"),
+        Index("ix_recipe_pub_date_created_at_id", "pub_date", "created_at", "id"),
+        Index("ix_recipe_favorites_count_id", "favorites_count", "id"),
+        Index("ix_recipe_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_recipe_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(200), unique=True, index=True)
     image = Column(String(200), unique=True)
+    image_variants = Column(JSONB, nullable=True)
     text = Column(Text)
     cooking_time = Column(Integer)
     pub_date = Column(DateTime(timezone=True), default=func.now())
+    favorites_count = Column(Integer, nullable=False, default=0, server_default="0")
+    search_vector = deferred(
+        Column(
+            TSVECTOR,
+            Computed(
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B')",
+                persisted=True,
+            ),
+        )
+    )
 
     author_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"))
     author = relationship(User)
@@ -83,13 +131,15 @@ class Recipe(Base, TimeStampMixin):
 
         select(Your_model.id, Recipe.json_agg_recipes_limit(request, recipes_limit))
         """
-        build: list[tuple[str, Any]] = [
+        build: list[Any] = [
             "id",
             cls.id,
             "name",
             cls.name,
             "image",
             cls.image_path(request),
+            "image_variants",
+            cls.image_variants,
             "cooking_time",
             cls.cooking_time,
         ]
@@ -106,3 +156,18 @@ class Recipe(Base, TimeStampMixin):
             ),
             else_=None,
         ).label("recipes")
+
+
+class IngredientOutbox(Base, TimeStampMixin):
+    """
+    Изменения ингредиентов рецептов, ожидающие отправки в сервис ингредиентов.
+    Пишется в одной транзакции с рецептом, `ingredients=None` означает удаление.
+    `rejected_at` заполняется, если сервис ингредиентов отклонил изменение.
+    """
+
+    id = Column(Integer, primary_key=True)
+    recipe_id = Column(Integer, nullable=False)
+    ingredients = Column(JSONB, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    rejected_at = Column(DateTime, nullable=True)
@@ -1,10 +1,13 @@
+from datetime import datetime
+from enum import Enum
 from typing import Any, Optional
 
 from fastapi import Form
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
+from application.exceptions import BadRequestException
 from application.recipes.models import Recipe
-from application.schemas import BaseSchema
+from application.schemas import BaseSchema, ImageVariantsMixin
 from application.tags.schemas import TagOut
 from application.users.schemas import UserOut
 
@@ -25,18 +28,51 @@ class AmountOut(IngredientOut):
         ]
 
 
+class CartFormat(str, Enum):
+    txt = "txt"
+    csv = "csv"
+
+    @property
+    def media_type(self) -> str:
+        return {"txt": "text/plain", "csv": "text/csv"}[self.value]
+
+
+class ImageUploadOut(BaseModel):
+    image: str
+    sha256: str
+    size: int
+
+
+class OutboxOut(BaseSchema):
+    recipe_id: int
+    ingredients: list[dict] | None
+    attempts: int
+    created_at: datetime
+    rejected_at: datetime
+
+
 class CreateAmountIngredient(BaseModel):
-    id: int = 0
-    amount: int | str = 0
+    id: int
+    amount: int = Field(gt=0, description="Количество")
 
 
-class FavoriteOut(BaseSchema):
+class FavoriteOut(BaseSchema, ImageVariantsMixin):
     name: str
     image: str
     cooking_time: int
 
 
 class BaseRecipe(BaseModel):
+    ingredients: list[CreateAmountIngredient] | None = None
+
+    @model_validator(mode="after")
+    def validator(self) -> "BaseRecipe":
+        if self.ingredients is not None:
+            ingredient_ids = [items.id for items in self.ingredients]
+            if len(set(ingredient_ids)) < len(ingredient_ids):
+                raise BadRequestException("Ингредиенты рецепта повторяются")
+        return self
+
     async def to_dict(self) -> NotImplementedError:
         raise NotImplementedError("Метод должен быть переопределен.")
 
@@ -45,8 +81,8 @@ class BaseRecipe(BaseModel):
 
     async def ingredients_to_list(self, recipe_id: int) -> list[dict[str, int]]:
         return [
-            {"recipe_id": recipe_id, "ingredient_id": items.id, "amount": int(items.amount)}
-            for items in self.ingredients
+            {"recipe_id": recipe_id, "ingredient_id": items.id, "amount": items.amount}
+            for items in self.ingredients or []
         ]
 
 
@@ -85,7 +121,7 @@ class UpdateRecipe(BaseRecipe):
     tags: list[int] | None = None
 
     async def to_dict(self, recipe: Recipe, filename: str | None = None) -> dict[str, Any]:
-        result = {"image": filename} if filename else {}
+        result = {"image": filename, "image_variants": None} if filename else {}
         for item in ("text", "name", "cooking_time", "text"):
             if change := getattr(self, item, None):
                 if change != getattr(recipe, item, None):
@@ -93,7 +129,7 @@ class UpdateRecipe(BaseRecipe):
         return result
 
 
-class RecipeOut(BaseSchema):
+class RecipeOut(BaseSchema, ImageVariantsMixin):
     name: str
     image: str
     tags: list[TagOut]
@@ -101,15 +137,17 @@ class RecipeOut(BaseSchema):
     ingredients: list[AmountOut] | None = None
     text: str
     cooking_time: int
+    favorites_count: int = 0
     is_favorited: bool = False
     is_in_shopping_cart: bool = False
 
     @staticmethod
     async def to_dict(
         recipe: "RecipeOut",
-        author: UserOut | None = None,
+        author: UserOut | dict | None = None,
         is_favorited: Optional[int] = False,
         is_in_shopping_cart: Optional[int] = False,
+        ingredients: list | None = None,
     ) -> dict[str, Any]:
         """сложные запросы двойное соединение `Favorite` и `Cart` к `User` создает ошибку."""
         if not isinstance(is_favorited, bool):
@@ -121,10 +159,13 @@ class RecipeOut(BaseSchema):
             "id": recipe.id,
             "name": recipe.name,
             "image": recipe.image,
+            "image_variants": recipe.image_variants,
             "tags": await TagOut.tuple_to_dict(recipe.tags),
             "author": author if author else recipe.author,
+            "ingredients": ingredients,
             "text": recipe.text,
             "cooking_time": recipe.cooking_time,
+            "favorites_count": recipe.favorites_count,
             "is_favorited": is_favorited,
             "is_in_shopping_cart": is_in_shopping_cart,
         }
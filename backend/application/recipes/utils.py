@@ -1,34 +1,193 @@
-import base64
+import asyncio
 import binascii
+import csv
+import hashlib
+import io
+import logging
 import os
+import re
+import time
+from typing import AsyncIterable, AsyncIterator
 from uuid import uuid4
 
 import aiofiles
 from starlette.exceptions import HTTPException
-from starlette.status import HTTP_418_IM_A_TEAPOT
+from starlette.status import HTTP_413_REQUEST_ENTITY_TOO_LARGE, HTTP_418_IM_A_TEAPOT
 
-from application.settings import ALLOWED_TYPES, INVALID_FILE, INVALID_TYPE, MEDIA_ROOT
+from application.database import db_redis
+from application.recipes.schemas import CartFormat
+from application.settings import (
+    ALLOWED_TYPES,
+    IMAGE_SIGNATURES,
+    IMAGE_TOO_LARGE,
+    INVALID_FILE,
+    INVALID_TYPE,
+    MEDIA_ROOT,
+    UPLOAD_ROOT,
+    settings,
+)
 
+logger = logging.getLogger(__name__)
 
-async def base64_image(base64_data: str, extension: str = "jpg") -> tuple[str, str]:
+SIGNATURE_SIZE = max(len(signature) for signature in IMAGE_SIGNATURES)
+UPLOAD_NAME = re.compile(r"[0-9a-f-]{36}\.[a-z]+")
+WHITESPACE = re.compile(r"\s")
+
+
+def image_type(data: bytes) -> str | None:
+    """Расширение по сигнатуре в начале файла или `None`, если это не картинка."""
+    for signature, extension in IMAGE_SIGNATURES.items():
+        if data.startswith(signature):
+            return extension
+    return None
+
+
+async def save_image(
+    chunks: AsyncIterable[bytes], directory: str = MEDIA_ROOT
+) -> tuple[str, str, str, int]:
+    """
+    Пишет картинку на диск по частям, в памяти держится только текущая часть.
+    Тип определяется по сигнатуре первых байт, размер ограничен `IMAGE_MAX_SIZE`,
+    sha256 считается по ходу записи. Возвращает имя, путь, sha256 и размер файла.
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest, size, head = hashlib.sha256(), 0, b""
+    filename, image_path, buffer = "", "", None
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > settings.IMAGE_MAX_SIZE:
+                raise HTTPException(HTTP_413_REQUEST_ENTITY_TOO_LARGE, IMAGE_TOO_LARGE)
+            digest.update(chunk)
+
+            if buffer is None:
+                head += chunk
+                if len(head) < SIGNATURE_SIZE:
+                    continue
+                if not (extension := image_type(head)):
+                    raise HTTPException(HTTP_418_IM_A_TEAPOT, INVALID_TYPE)
+                filename = f"{uuid4()}.{extension}"
+                image_path = os.path.join(directory, filename)
+                buffer = await aiofiles.open(image_path, "wb")
+                chunk, head = head, b""
+
+            await buffer.write(chunk)
+
+        if buffer is None:
+            raise HTTPException(HTTP_418_IM_A_TEAPOT, INVALID_FILE)
+
+    except BaseException:
+        if buffer is not None:
+            await buffer.close()
+            os.remove(image_path)
+        raise
+
+    await buffer.close()
+    return filename, image_path, digest.hexdigest(), size
+
+
+async def base64_chunks(data: str, start: int = 0) -> AsyncIterator[bytes]:
+    """
+    Декодирует base64 частями по `IMAGE_CHUNK_SIZE` байт без копии всей строки.
+    Пробелы и переносы строк убираются в каждой части отдельно, а граница части
+    считается по символам base64, поэтому декодируется всегда кратное четырем число символов.
+    """
+    step = settings.IMAGE_CHUNK_SIZE // 3 * 4
+    pending = ""
+    for offset in range(start, len(data), step):
+        pending += WHITESPACE.sub("", data[offset : offset + step])
+        while len(pending) >= step:
+            yield binascii.a2b_base64(pending[:step])
+            pending = pending[step:]
+    if pending:
+        yield binascii.a2b_base64(pending)
+
+
+async def base64_image(base64_data: str) -> tuple[str, str]:
     """
     Проверяет формат файла если он есть.
     При удачном декодировании base64, файл будет сохранен.
+    Расширение файла определяется по сигнатуре, а не по заголовку data URL.
     """
-    if ";base64," in base64_data:
-        header, base64_data = base64_data.split(";base64,")
-        name, extension = header.split("/")
+    start = base64_data.find(";base64,")
+    if start != -1:
+        name, extension = base64_data[:start].split("/")
         if extension.lower() not in ALLOWED_TYPES:
             raise HTTPException(HTTP_418_IM_A_TEAPOT, INVALID_TYPE)
 
-    filename = f"{uuid4()}.{extension}"
+    start = start + len(";base64,") if start != -1 else 0
+    try:
+        filename, image_path, *_ = await save_image(base64_chunks(base64_data, start))
+    except (TypeError, binascii.Error, ValueError, OSError):
+        raise HTTPException(HTTP_418_IM_A_TEAPOT, INVALID_FILE)
+
+    return filename, image_path
+
+
+async def claim_upload(filename: str, user_id: int) -> tuple[str, str]:
+    """Переносит в `MEDIA_ROOT` файл, загруженный этим пользователем через `/recipes/images/`."""
+    owner = await db_redis.getdel(f"upload:{filename}")
     image_path = os.path.join(MEDIA_ROOT, filename)
+    try:
+        if owner != str(user_id):
+            raise FileNotFoundError(filename)
+        os.replace(os.path.join(UPLOAD_ROOT, filename), image_path)
+    except OSError:
+        raise HTTPException(HTTP_418_IM_A_TEAPOT, INVALID_FILE)
+    return filename, image_path
+
 
+async def recipe_image(image: str, user_id: int) -> tuple[str, str]:
+    """Картинка рецепта: имя загруженного файла или, как раньше, base64."""
+    if UPLOAD_NAME.fullmatch(image):
+        return await claim_upload(image, user_id)
+    return await base64_image(image)
+
+
+def sweep_uploads() -> None:
+    """Удаляет загрузки, не использованные в рецептах за `UPLOAD_TTL` секунд."""
+    expired = time.time() - settings.UPLOAD_TTL
     try:
-        async with aiofiles.open(image_path, "wb") as buffer:
-            await buffer.write(base64.b64decode(base64_data))
+        entries = list(os.scandir(UPLOAD_ROOT))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
 
-    except (Exception, TypeError, binascii.Error, ValueError):
-        raise HTTPException(HTTP_418_IM_A_TEAPOT, INVALID_FILE)
 
-    return filename, image_path
+async def sweep_uploads_periodically() -> None:
+    """Раз в `UPLOAD_SWEEP_INTERVAL` секунд вызывает `sweep_uploads` в отдельном потоке,
+    чтобы обход каталога не блокировал цикл событий. Запускается в `lifespan`."""
+    while True:
+        await asyncio.sleep(settings.UPLOAD_SWEEP_INTERVAL)
+        try:
+            await asyncio.to_thread(sweep_uploads)
+        except OSError as e:
+            logger.error(e)
+
+
+async def shopping_cart_file(
+    ingredients: list[dict], file_format: CartFormat
+) -> AsyncIterator[str]:
+    """
+    Построчно отдает файл со списком покупок для `StreamingResponse`.
+    Ингредиенты уже суммированы сервисом ингредиентов, файл на диск не пишется.
+    """
+    if file_format == CartFormat.csv:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(("name", "amount", "measurement_unit"))
+        for item in ingredients:
+            writer.writerow((item["name"], item["amount"], item["measurement_unit"]))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    for item in ingredients:
+        yield "{} - {} {}.\n".format(item["name"], item["amount"], item["measurement_unit"])
@@ -1,25 +1,38 @@
 import logging
-import os
 from typing import Any
 
-import aiofiles
 from asyncpg.exceptions import UniqueViolationError
-from fastapi import APIRouter, Depends
-from fastapi.responses import FileResponse, JSONResponse, Response
-from starlette.background import BackgroundTask
+from fastapi import APIRouter, BackgroundTasks, Depends, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.exceptions import HTTPException
 from starlette.requests import Request
-from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_201_CREATED,
+    HTTP_204_NO_CONTENT,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+)
 
-from application.auth.permissions import IsAuthenticated, IsAvtor, PermissionsDependency
+from application.auth.permissions import IsAdmin, IsAuthenticated, IsAvtor, PermissionsDependency
+from application.cache import recipe_cache
+from application.database import db_redis
 from application.exceptions import BadRequestException, NotFoundException
-from application.managers import Manager
-from application.recipes.managers import FavoriteCartManager, RecipeManager
+from application.managers import CountManager, Manager
+from application.recipes.images import process_image
+from application.recipes.managers import FavoriteCartManager, RecipeManager, outbox
 from application.recipes.models import Cart, Favorite, Recipe
-from application.recipes.schemas import CreateRecipe, RecipeOut, UpdateRecipe
-from application.recipes.utils import base64_image
+from application.recipes.schemas import (
+    CartFormat,
+    CreateRecipe,
+    ImageUploadOut,
+    OutboxOut,
+    RecipeOut,
+    UpdateRecipe,
+)
+from application.recipes.utils import recipe_image, save_image, shopping_cart_file
 from application.schemas import Result, SearchRecipe
 from application.services import image_delete
-from application.settings import FILES_ROOT
+from application.settings import IMAGE_TOO_LARGE, UPLOAD_ROOT, settings
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +41,27 @@ favorite = FavoriteCartManager(Favorite)
 cart = FavoriteCartManager(Cart)
 
 
+@router.post(
+    "/images/",
+    response_model=ImageUploadOut,
+    dependencies=[Depends(PermissionsDependency([IsAuthenticated]))],
+    response_description="Картинка загружена",
+    status_code=HTTP_201_CREATED,
+)
+async def upload_image(request: Request) -> JSONResponse:
+    """Загрузка картинки рецепта телом запроса без base64 и multipart.<br>
+    Файл пишется на диск по частям, размер ограничен `IMAGE_MAX_SIZE` байт.<br>
+    Полученное имя передается в поле `image` при создании или обновлении рецепта,
+    неиспользованные загрузки удаляются через `UPLOAD_TTL` секунд."""
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.IMAGE_MAX_SIZE:
+        raise HTTPException(HTTP_413_REQUEST_ENTITY_TOO_LARGE, IMAGE_TOO_LARGE)
+
+    filename, _, sha256, size = await save_image(request.stream(), UPLOAD_ROOT)
+    await db_redis.set(f"upload:{filename}", request.user.id, ex=settings.UPLOAD_TTL)
+    return JSONResponse({"image": filename, "sha256": sha256, "size": size}, HTTP_201_CREATED)
+
+
 @router.post(
     "/",
     response_model=RecipeOut,
@@ -35,11 +69,16 @@ cart = FavoriteCartManager(Cart)
     response_description="Рецепт успешно создан",
     status_code=HTTP_201_CREATED,
 )
-async def create_recipe(request: Request, recipe_in: CreateRecipe) -> JSONResponse:
+async def create_recipe(
+    request: Request, recipe_in: CreateRecipe, background_tasks: BackgroundTasks
+) -> JSONResponse:
     """Создание рецепта.<br>
     Доступно только авторизованному пользователю.<br>
-    Картинка в фронтенда поступает в формате base64."""
-    filename, image_path = await base64_image(recipe_in.image)
+    Картинка в фронтенда поступает в формате base64
+    или именем файла, загруженного через `/recipes/images/`.<br>
+    Уменьшенные копии картинки появляются в `image_variants` после фоновой обработки."""
+    ingredients = await RecipeManager.check_ingredients(recipe_in.ingredients)
+    filename, image_path = await recipe_image(recipe_in.image, request.user.id)
     try:
         items = await recipe_in.to_dict(request.user.id, filename)
         recipe_id = await RecipeManager().create(items, recipe_in)
@@ -50,12 +89,13 @@ async def create_recipe(request: Request, recipe_in: CreateRecipe) -> JSONRespon
         raise BadRequestException("Ошибка создания рецепта")
 
     if recipe_id:
-        return await RecipeManager().get(request, recipe_id)
+        background_tasks.add_task(process_image, recipe_id, filename)
+        return await RecipeManager().get(request, recipe_id, ingredients)
     raise NotFoundException
 
 
 @router.get("/", response_model=Result[RecipeOut], status_code=HTTP_200_OK)
-async def get_recipes(request: Request, params: SearchRecipe = Depends()) -> JSONResponse:
+async def get_recipes(request: Request, params: SearchRecipe = Depends()) -> Any:
     """Список рецептов.<br>
     Страница доступна всем пользователям.<br>
     Доступна фильтрация по избранному, автору, списку покупок и тегам."""
@@ -67,11 +107,17 @@ async def get_recipes(request: Request, params: SearchRecipe = Depends()) -> JSO
             "доступна только авторизованному пользователю"
         )
 
-    params.is_favorited = False if params.is_favorited and user_id else True
-    params.is_in_shopping_cart = False if params.is_in_shopping_cart and user_id else True
+    if user_id:
+        count, result = await RecipeManager().get_all(request, params)
+        return await Result.result(request.url, count, params, result)
 
-    count, result = await RecipeManager().get_all(request, params)
-    return await Result.result(request.url, count, params, result)
+    async def build() -> str:
+        count, result = await RecipeManager().get_all(request, params)
+        page = await Result.result(request.url, count, params, result)
+        return Result[RecipeOut].model_validate(page).model_dump_json()
+
+    key = recipe_cache.key(request.base_url, params.cache_key)
+    return await recipe_cache.response(request, key, ["recipe_list"], build)
 
 
 @router.get(
@@ -80,56 +126,57 @@ async def get_recipes(request: Request, params: SearchRecipe = Depends()) -> JSO
     dependencies=[Depends(PermissionsDependency([IsAuthenticated]))],
     status_code=HTTP_200_OK,
 )
-async def download_shopping_cart(request: Request) -> FileResponse | JSONResponse:
+async def download_shopping_cart(
+    request: Request,
+    file_format: CartFormat = Query(CartFormat.txt, alias="format", description="TXT или CSV"),
+) -> StreamingResponse:
     """Скачать файл со списком покупок.<br>
-    Это может быть TXT/PDF/CSV.<br>
+    Это может быть TXT/CSV.<br>
     Пользователь получает файл с суммированным перечнем <br>
     и количеством необходимых ингредиентов для всех рецептов.<br>
     Доступно только авторизованным пользователям.
     """
-
-    def cleanup() -> None:
-        if os.path.isfile(file_path):
-            os.remove(file_path)
-
     if ingredients := await FavoriteCartManager.get_shopping_cart(request.user.id):
-        ingredients_set = {}
-        for item in ingredients:
-            if ingredients_set.get("name", None):
-                ingredients_set[item["name"]]["amount"] += item["amount"]
-            else:
-                ingredients_set[item["name"]] = {
-                    "amount": item["amount"],
-                    "measurement_unit": item["measurement_unit"],
-                }
-
-        cart_list = [
-            "{} - {} {}.\n".format(
-                name,
-                ingredients_set[name]["amount"],
-                ingredients_set[name]["measurement_unit"],
-            )
-            for name in ingredients_set
-        ]
-        file_path = os.path.join(FILES_ROOT, f"{request.user.username}.txt")
-        try:
-            async with aiofiles.open(file_path, "w", encoding="utf-8") as buffer:
-                await buffer.write("".join(cart_list))
+        return StreamingResponse(
+            shopping_cart_file(ingredients, file_format),
+            media_type=file_format.media_type,
+            headers={
+                "Content-Disposition": f'attachment; filename="shopping_cart.{file_format.value}"'
+            },
+        )
+    raise NotFoundException
 
-        except Exception as e:
-            logger.error(e)
-            raise BadRequestException("Не удалось загрузить корзину")
 
-        return FileResponse(file_path, background=BackgroundTask(cleanup))
-    raise NotFoundException
+@router.get(
+    "/outbox/rejected/",
+    response_model=list[OutboxOut],
+    dependencies=[Depends(PermissionsDependency([IsAuthenticated, IsAdmin]))],
+    status_code=HTTP_200_OK,
+)
+async def get_rejected_outbox() -> list:
+    """Изменения ингредиентов, отклоненные сервисом ингредиентов.<br>
+    Доступно только администратору."""
+    return await outbox.rejected()
 
 
 @router.get("/{recipe_id}/", response_model=RecipeOut, status_code=HTTP_200_OK)
 async def get_recipe(request: Request, recipe_id: int) -> Any:
-    """Получение рецепта."""
-    if result := await RecipeManager().get(request, recipe_id):
-        return result
-    raise NotFoundException
+    """Получение рецепта.<br>
+    Для неавторизованных пользователей ответ кэшируется и поддерживает `ETag`."""
+    if request.user.id:
+        if result := await RecipeManager().get(request, recipe_id):
+            return result
+        raise NotFoundException
+
+    async def build() -> str:
+        if result := await RecipeManager().get(request, recipe_id):
+            return RecipeOut.model_validate(result).model_dump_json()
+        raise NotFoundException
+
+    key = recipe_cache.key(request.base_url, recipe_id)
+    return await recipe_cache.response(
+        request, key, ["recipe_detail", f"recipe:{recipe_id}"], build
+    )
 
 
 @router.patch(
@@ -138,7 +185,9 @@ async def get_recipe(request: Request, recipe_id: int) -> Any:
     dependencies=[Depends(PermissionsDependency([IsAuthenticated]))],
     status_code=HTTP_200_OK,
 )
-async def update_recipe(request: Request, recipe_id: int, recipe_in: UpdateRecipe) -> JSONResponse:
+async def update_recipe(
+    request: Request, recipe_id: int, recipe_in: UpdateRecipe, background_tasks: BackgroundTasks
+) -> JSONResponse:
     """Обновление рецепта.<br>
     Доступно только автору данного рецепта <br>
     Перед редактированием рецепта, фронт получает данные рецепта <br>
@@ -150,14 +199,18 @@ async def update_recipe(request: Request, recipe_id: int, recipe_in: UpdateRecip
         raise NotFoundException
 
     if await IsAvtor().caxtom_has_permission(request, recipe.author_id):
+        if recipe_in.ingredients is not None:
+            await RecipeManager.check_ingredients(recipe_in.ingredients)
         if recipe_in.image:
-            filename, image_path = await base64_image(recipe_in.image)
+            filename, image_path = await recipe_image(recipe_in.image, request.user.id)
             items = await recipe_in.to_dict(recipe, filename)
         else:
             items = await recipe_in.to_dict(recipe)
 
         try:
             if await RecipeManager().update(recipe_id, items, recipe_in):
+                if recipe_in.image:
+                    background_tasks.add_task(process_image, recipe_id, filename)
                 return JSONResponse({"detail": "Рецепт успешно обновлен"}, HTTP_200_OK)
 
         except Exception as e:
@@ -184,7 +237,9 @@ async def delete_recipe(request: Request, recipe_id: int) -> JSONResponse:
         raise NotFoundException
 
     if await IsAvtor().caxtom_has_permission(request, author_id):
-        if await Manager(Recipe).delete(recipe_id):
+        if await RecipeManager().delete(recipe_id, author_id):
+            await CountManager(Recipe).invalidate()
+            await recipe_cache.invalidate("recipe_list", f"recipe:{recipe_id}")
             return Response(status_code=HTTP_204_NO_CONTENT)
 
     raise BadRequestException("При удалении рецепта произошла ошибка")
@@ -1,13 +1,21 @@
-from typing import Any, Generic, Sequence, TypeVar
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Any, ClassVar, Generic, Literal, Sequence, TypeVar
 
 from fastapi import Query
-from pydantic import AnyUrl, BaseModel, Field
-from sqlalchemy import Select, select
+from pydantic import AnyUrl, BaseModel, Field, PrivateAttr, model_validator
+from sqlalchemy import Column, Select, and_, cast, exists, false, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import ColumnElement
 from starlette.datastructures import URL
 
-from application.recipes.models import Recipe
+from application.exceptions import BadRequestException
+from application.recipes.models import SEARCH_CONFIG, Recipe
 from application.settings import PAGINATION_SIZE
+from application.tags.models import recipe_tag
 from application.users.models import User
 
 name_str = "^([А-Яа-я]+|[A-Za-z]+)$"
@@ -24,7 +32,40 @@ class BaseSchema(BaseModel):
         from_attributes = True
 
 
+class ImageVariantsMixin(BaseModel):
+    """
+    Уменьшенные копии картинки `{размер: {формат: ссылка}}`, пока копий нет - `None`.
+    Копии лежат рядом с оригиналом, поэтому имена файлов превращаются в ссылки
+    относительно ссылки `image`.
+    """
+
+    image: str
+    image_variants: dict[str, dict[str, str]] | None = None
+
+    @model_validator(mode="after")
+    def variants_to_url(self) -> "ImageVariantsMixin":
+        if self.image_variants:
+            base = self.image.rsplit("/", 1)[0]
+            self.image_variants = {
+                size: {
+                    image_format: name if "/" in name else f"{base}/{name}"
+                    for image_format, name in formats.items()
+                }
+                for size, formats in self.image_variants.items()
+            }
+        return self
+
+
 class Params(BaseModel):
+    """
+    Пагинация по номеру страницы (`OFFSET`) или, если у списка задан `keyset_columns`,
+    по курсору: `?keyset=true` для первой страницы, далее `?cursor=` из ссылки `next`.
+    Курсор хранит значения `keyset_columns` последнего объекта страницы.
+    """
+
+    keyset_columns: ClassVar[tuple[Column, ...]] = ()
+    keyset_desc: ClassVar[bool] = False
+
     page: int = Query(1, ge=1, description="Номер страницы.")
     limit: int = Query(
         PAGINATION_SIZE,
@@ -32,6 +73,31 @@ class Params(BaseModel):
         le=1000,
         description="Количество объектов на странице.",
     )
+    keyset: bool = Query(False, description="Пагинация по курсору вместо номера страницы.")
+    cursor: str | None = Query(None, description="Курсор следующей страницы.")
+
+    _next_cursor: str | None = PrivateAttr(None)
+
+    @property
+    def is_keyset(self) -> bool:
+        return bool(self.keyset_columns) and (self.keyset or self.cursor is not None)
+
+    @property
+    def next_cursor(self) -> str | None:
+        return self._next_cursor
+
+    @property
+    def count_key(self) -> str:
+        """Нормализованные параметры фильтрации без пагинации, ключ кэша общего количества."""
+        items = self.model_dump(exclude={"page", "limit", "keyset", "cursor", "with_ingredients"})
+        items = {k: sorted(v) if isinstance(v, list) else v for k, v in items.items()}
+        return json.dumps(items, sort_keys=True, default=str)
+
+    @property
+    def cache_key(self) -> str:
+        """Нормализованные параметры запроса вместе с пагинацией, ключ кэша ответа."""
+        items = {k: sorted(v) if isinstance(v, list) else v for k, v in self.model_dump().items()}
+        return json.dumps(items, sort_keys=True, default=str)
 
     @property
     def has_previous(self) -> bool:
@@ -49,10 +115,53 @@ class Params(BaseModel):
         return select(func.count(model.id).label("is_count"))
 
     async def limit_offset(self, query: Select) -> Select:
+        if self.is_keyset:
+            return await self.keyset_filter(query)
         return query.limit(self.limit).offset(self.limit * (self.page - 1))
 
+    @staticmethod
+    def encode_cursor(values: Sequence[Any]) -> str:
+        raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor: str) -> list[Any]:
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.keyset_columns):
+                raise ValueError
+            return [
+                datetime.fromisoformat(value) if column.type.python_type is datetime else value
+                for column, value in zip(self.keyset_columns, values)
+            ]
+        except (binascii.Error, ValueError, TypeError):
+            raise BadRequestException("Некорректный курсор")
+
+    async def keyset_filter(self, query: Select) -> Select:
+        """Сортирует по `keyset_columns` и продолжает выборку после объекта из курсора.
+        Берется на один объект больше, чтобы узнать, есть ли следующая страница."""
+        columns = tuple_(*self.keyset_columns)
+        if self.cursor:
+            values = tuple_(*self.decode_cursor(self.cursor))
+            query = query.where(columns < values if self.keyset_desc else columns > values)
+
+        ordering = [c.desc() if self.keyset_desc else c.asc() for c in self.keyset_columns]
+        return query.order_by(None).order_by(*ordering).limit(self.limit + 1)
+
+    async def keyset_page(self, rows: list) -> list:
+        """Обрезает лишний объект после `keyset_filter` и запоминает курсор следующей страницы."""
+        if not self.is_keyset or len(rows) <= self.limit:
+            return rows
+
+        rows = rows[: self.limit]
+        self._next_cursor = self.encode_cursor(
+            [getattr(rows[-1], column.key) for column in self.keyset_columns]
+        )
+        return rows
+
 
 class SubParams(Params):
+    keyset_columns = (User.username, User.id)
+
     recipes_limit: int = Query(
         3,
         ge=1,
@@ -70,7 +179,7 @@ class SubParams(Params):
                 "last_name": items.last_name,
                 "is_subscribed": items.is_subscribed,
                 "recipes": items.recipes,
-                "recipes_count": self.recipes_limit,
+                "recipes_count": items.recipes_count,
             }
             for items in results
         ]
@@ -92,6 +201,8 @@ class SearchName(Params):
 
 
 class SearchUser(Params):
+    keyset_columns = (User.id,)
+
     first_name: str | None = Query(
         None,
         pattern=name_str,
@@ -123,38 +234,101 @@ class IsFavoritedCartRecipeMixin(BaseModel):
 
 
 class SearchRecipe(Params, IsFavoritedCartRecipeMixin):
+    keyset_columns = (Recipe.pub_date, Recipe.created_at, Recipe.id)
+    keyset_desc = True
+
     author: int = Query(0, description="Показывать рецепты только автора с указанным id.")
     tags: list[str] = Field(
         Query([], description="Показывать рецепты только с указанными тегами (по slug)")
     )
+    tags_match: Literal["all", "any"] = Query(
+        "all",
+        description="Рецепт должен иметь все указанные теги (`all`) или любой из них (`any`).",
+    )
+    ordering: Literal["new", "popular"] = Query(
+        "new",
+        description="Сначала новые (`new`) или добавленные в избранное чаще всего (`popular`). "
+        "Популярные пагинируются только по номеру страницы.",
+    )
+    with_ingredients: bool = Query(False, description="Добавить к рецептам список ингредиентов.")
+    q: str | None = Query(
+        None,
+        min_length=2,
+        max_length=200,
+        description="Полнотекстовый поиск по названию и описанию с учетом опечаток в названии, "
+        "результаты сортируются по релевантности. Пагинация только по номеру страницы.",
+    )
+
+    @property
+    def is_keyset(self) -> bool:
+        return not self.q and self.ordering == "new" and super().is_keyset
+
+    def tags_filter(self, tag_ids: dict[str, int]) -> ColumnElement:
+        """Условие `EXISTS` по `recipe_tag` для id тегов из запроса.
+        Неизвестный slug при `all` дает пустой список, при `any` пропускается."""
+        ids = {tag_ids[slug] for slug in self.tags if slug in tag_ids}
+        if not ids or (self.tags_match == "all" and len(ids) < len(set(self.tags))):
+            return false()
+
+        recipe_has_tag = exists().where(recipe_tag.c.recipe_id == Recipe.id)
+        if self.tags_match == "any":
+            return recipe_has_tag.where(recipe_tag.c.tag_id.in_(ids))
+        return and_(*(recipe_has_tag.where(recipe_tag.c.tag_id == pk) for pk in sorted(ids)))
 
     async def search(self, query: Select) -> tuple[Select, Select] | list[Select]:
         count = await self.count(Recipe)
         query = await self.limit_offset(query)
 
+        if self.q:
+            tsquery = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), self.q)
+            matched = or_(
+                Recipe.search_vector.op("@@")(tsquery),
+                Recipe.name.op("%>")(self.q),
+            )
+            rank = func.ts_rank_cd(Recipe.search_vector, tsquery) + func.word_similarity(
+                self.q, Recipe.name
+            )
+            count, query = count.where(matched), query.where(matched)
+            query = query.order_by(None).order_by(rank.desc(), Recipe.id.desc())
+        elif self.ordering == "popular":
+            query = query.order_by(None).order_by(Recipe.favorites_count.desc(), Recipe.id.desc())
+
         if self.author:
             return [i.where(Recipe.author_id == self.author) for i in (count, query)]
         return count, query
 
 
 class Result(BaseModel, Generic[_TS]):
-    count: int = Field(0, description="Общее количество объектов в базе.")
+    count: int | None = Field(
+        0, description="Общее количество объектов в базе, при пагинации по курсору не считается."
+    )
     next: AnyUrl | None = Field(None, description="Ссылка на следующую страницу.")
     previous: AnyUrl | None = Field(None, description="Ссылка на предыдущую страницу.")
     results: list[_TS] = Field([], description="Список объектов текущей страницы.")
 
     @staticmethod
-    async def result(url: URL, count: int, params: Params, results: list) -> dict[str, Any]:
+    async def result(url: URL, count: int | None, params: Params, results: list) -> dict[str, Any]:
         """Составляет json ответ для пользователя в соответствии с требованиями.
         Составляет следующую, предыдущую и количество страниц для пагинации."""
+        if params.is_keyset:
+            cursor = params.next_cursor
+            return {
+                "count": None,
+                "next": str(url.include_query_params(cursor=cursor)) if cursor else None,
+                "previous": None,
+                "results": results,
+            }
+
         page = params.page
         return {
             "count": count,
             "next": (
-                str(url.replace_query_params(page=page + 1)) if params.has_next(count) else None
+                str(url.include_query_params(page=page + 1))
+                if params.has_next(count or 0)
+                else None
             ),
             "previous": (
-                str(url.replace_query_params(page=page - 1)) if params.has_previous else None
+                str(url.include_query_params(page=page - 1)) if params.has_previous else None
             ),
             "results": results,
         }
@@ -1,37 +1,161 @@
+import glob
 import os
+import re
+from time import perf_counter
 
 import httpx
+from prometheus_client import Counter, Histogram
 
 from application.settings import MEDIA_ROOT, settings
 
+INGREDIENTS_DURATION = Histogram(
+    "ingredients_request_duration_seconds",
+    "Длительность запросов к сервису ингредиентов.",
+    ("method", "path", "status"),
+)
+INGREDIENTS_ERRORS = Counter(
+    "ingredients_request_errors",
+    "Ошибки запросов к сервису ингредиентов: исключения клиента и ответы 5xx.",
+    ("method", "path", "error"),
+)
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+class MetricsTransport(httpx.AsyncBaseTransport):
+    """Учитывает время и ошибки запросов, id в пути заменяются на `{id}`."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        path = ID_SEGMENT.sub("/{id}", request.url.path)
+        start = perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            INGREDIENTS_ERRORS.labels(request.method, path, type(e).__name__).inc()
+            raise
+
+        status = str(response.status_code)
+        INGREDIENTS_DURATION.labels(request.method, path, status).observe(perf_counter() - start)
+        if response.status_code >= 500:
+            INGREDIENTS_ERRORS.labels(request.method, path, status).inc()
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class HTTPClientManager:
+    """
+    Общий асинхронный клиент сервиса ингредиентов с пулом keep-alive соединений.
+    Инициализируется и закрывается в `lifespan` приложения.
+
+    .. code-block:: python
+
+        httpclient.init(settings.INGREDIENTS_URL)
+        response = await httpclient.client.get("your_path/")
+        await httpclient.close()
+    """
+
+    def __init__(self) -> None:
+        self._client: httpx.AsyncClient | None = None
+
+    def init(
+        self,
+        base_url: str = settings.INGREDIENTS_URL,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        """`transport` заменяет сетевой транспорт, например `httpx.ASGITransport` в бенчмарке."""
+        transport = transport or httpx.AsyncHTTPTransport(
+            http2=settings.INGREDIENTS_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.INGREDIENTS_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.INGREDIENTS_MAX_KEEPALIVE,
+                keepalive_expiry=settings.INGREDIENTS_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            transport=MetricsTransport(transport),
+            timeout=httpx.Timeout(
+                settings.INGREDIENTS_TIMEOUT,
+                connect=settings.INGREDIENTS_CONNECT_TIMEOUT,
+            ),
+        )
+
+    async def close(self) -> None:
+        if self._client is None:
+            raise Exception("HTTPClientManager is not initialized")
+
+        await self._client.aclose()
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise Exception("HTTPClientManager is not initialized")
+        return self._client
+
+
+httpclient = HTTPClientManager()
+
 
 async def image_delete(filename: str = "", image_path: str = "") -> None:
+    """Удаляет картинку вместе с ее уменьшенными копиями `{имя}_{размер}.{формат}`."""
     if not image_path:
         image_path = os.path.join(MEDIA_ROOT, filename)
-    if os.path.isfile(image_path):
-        os.remove(image_path)
+    stem = os.path.splitext(image_path)[0]
+    for path in (image_path, *glob.glob(f"{glob.escape(stem)}_*")):
+        if os.path.isfile(path):
+            os.remove(path)
 
 
 async def get_is_ingredients(recipe_id: int):
-    response = httpx.get(settings.INGREDIENTS_URL + f"{recipe_id}/")
+    try:
+        response = await httpclient.client.get(f"{recipe_id}/")
+    except httpx.HTTPError:
+        return False
     return response.json() if response.status_code == 200 else False
 
 
-async def get_shopping_cart(in_data: list[int]):
-    response = httpx.get(settings.INGREDIENTS_URL + "shopping_cart/", json=in_data)
-    return response.json() if response.status_code == 200 else False
+async def get_bulk_ingredients(recipe_ids: list[int]) -> dict[int, list]:
+    """Ингредиенты нескольких рецептов одним запросом, ключи - id рецептов.
+    Если сервис недоступен, рецепты отдаются без ингредиентов."""
+    if not recipe_ids:
+        return {}
+    try:
+        response = await httpclient.client.post("bulk/", json=recipe_ids)
+    except httpx.HTTPError:
+        return {}
+    if response.status_code == 200:
+        return {int(pk): ingredients for pk, ingredients in response.json().items()}
+    return {}
 
 
-async def delete_is_ingredients(recipe_id: int):
-    response = httpx.delete(settings.INGREDIENTS_URL + f"{recipe_id}/")
-    return True if response.status_code == 200 else False
+async def lookup_ingredients(ingredient_ids: list[int]) -> dict[int, dict] | None:
+    """Существующие ингредиенты из `ingredient_ids` по id или `None`, если сервис недоступен."""
+    try:
+        response = await httpclient.client.post("lookup/", json=ingredient_ids)
+    except httpx.HTTPError:
+        return None
+    if response.status_code == 200:
+        return {ingredient["id"]: ingredient for ingredient in response.json()}
+    return None
 
 
-async def post_is_ingredients(in_data: dict):
-    response = httpx.post(settings.INGREDIENTS_URL, json=in_data)
-    return True if response.status_code == 200 else False
+async def get_shopping_cart(in_data: list[int]):
+    response = await httpclient.client.request("GET", "shopping_cart/", json=in_data)
+    return response.json() if response.status_code == 200 else False
 
 
-async def update_is_ingredients(in_data: dict):
-    response = httpx.put(settings.INGREDIENTS_URL, json=in_data)
-    return True if response.status_code == 200 else False
+async def post_batch_ingredients(in_data: list[dict], idempotency_key: str) -> list[int] | None:
+    """Заменяет ингредиенты нескольких рецептов, `ingredients=None` удаляет их.
+    Возвращает id отклоненных рецептов или `None`, если пакет нужно отправить повторно."""
+    try:
+        response = await httpclient.client.post(
+            "batch/", json=in_data, headers={"Idempotency-Key": idempotency_key}
+        )
+    except httpx.HTTPError:
+        return None
+    return response.json() if response.status_code == 200 else None
@@ -1,6 +1,7 @@
 import logging
 import os
 from datetime import timedelta
+from typing import Literal
 
 from pydantic import AnyHttpUrl, PostgresDsn, RedisDsn
 from pydantic_settings import BaseSettings
@@ -16,6 +17,9 @@ class RedisSettings(BaseSettings):
     REDIS_HOST: str | None = "delibasket-redis"
     REDIS_PORT: int | None = 6379
     REDIS_PASSWORD: str | None = "qwerty"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0
+    REDIS_SOCKET_TIMEOUT: float = 5.0
 
     @property
     def REDIS_URL(self) -> RedisDsn:
@@ -31,8 +35,16 @@ class PostgresSettings(BaseSettings):
     POSTGRES_SERVER: str | None = "delibasket-db"
     POSTGRES_PORT: int | None = 5432
 
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_RECYCLE: int = 1800
+    POSTGRES_POOL_TIMEOUT: float = 30.0
+    POSTGRES_POOL_PRE_PING: bool = True
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 100
+    POSTGRES_PGBOUNCER: bool = False
+
     @property
-    def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
+    def SQLALCHEMY_DATABASE_URI(self) -> str:
         return (
             f"postgresql+asyncpg://{self.POSTGRES_USER}:"
             f"{self.POSTGRES_PASSWORD}@"
@@ -45,15 +57,49 @@ class PostgresSettings(BaseSettings):
 class Settings(RedisSettings, PostgresSettings):
     API_V1_STR: str = "/api"
     BACKEND_TOKEN_EXP: int | None = 10
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: int = 30
+    TOKEN_INVALIDATE_CHANNEL: str = "auth:token:invalidate"
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_MAX_WORKERS: int = 2
+    COUNT_STRATEGY: Literal["exact", "cached", "estimate"] = "exact"
+    COUNT_CACHE_TTL: int = 300
+    RESPONSE_CACHE_TTL: int = 60
+    CATALOG_CACHE_TTL: int = 3600
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_MAX_BACKOFF: int = 300
+    IMAGE_MAX_WORKERS: int = 2
+    IMAGE_SIZES: dict[str, int] = {"list": 480, "detail": 1200}
+    IMAGE_FORMATS: list[str] = ["avif", "webp"]
+    IMAGE_QUALITY: int = 80
+    IMAGE_MAX_SIZE: int = 10485760
+    IMAGE_CHUNK_SIZE: int = 65536
+    UPLOAD_TTL: int = 3600
+    UPLOAD_SWEEP_INTERVAL: int = 600
     TESTING: bool | None = False
+    SQL_QUERY_BUDGET: int = 20
+    METRICS_POOL_INTERVAL: float = 5.0
+    DEBUG_TOOLBAR: bool = False
 
     BACKEND_CORS_ORIGINS: list[AnyHttpUrl] = []
     INGREDIENTS_DOMAIN: str | None = "host.docker.internal:9989"
+    INGREDIENTS_HTTP2: bool = False
+    INGREDIENTS_TIMEOUT: float = 5.0
+    INGREDIENTS_CONNECT_TIMEOUT: float = 2.0
+    INGREDIENTS_MAX_CONNECTIONS: int = 100
+    INGREDIENTS_MAX_KEEPALIVE: int = 20
+    INGREDIENTS_KEEPALIVE_EXPIRY: float = 30.0
 
     @property
     def TOKEN_EXP(self) -> timedelta:
         return timedelta(seconds=self.BACKEND_TOKEN_EXP)
 
+    @property
+    def TOKEN_CACHE_EXP(self) -> int:
+        """Время жизни токена в локальном кэше воркера, не больше времени жизни токена."""
+        return min(self.TOKEN_CACHE_TTL, self.BACKEND_TOKEN_EXP or self.TOKEN_CACHE_TTL)
+
     @property
     def INGREDIENTS_URL(self) -> str:
         return f"http://{self.INGREDIENTS_DOMAIN}{self.API_V1_STR}/ingredients/recipe/"
@@ -85,10 +131,18 @@ BASE_DIR: str = os.path.dirname(os.path.abspath(__file__))
 MEDIA_URL: str = "media"
 MEDIA_ROOT: str = os.path.join(BASE_DIR, MEDIA_URL)
 FILES_ROOT: str = os.path.join(MEDIA_ROOT, "files")
+UPLOAD_ROOT: str = os.path.join(MEDIA_ROOT, "uploads")
 DATA_ROOT: str = os.path.join(BASE_DIR, "data")
 
 ALLOWED_TYPES: tuple[str, str, str, str] = ("jpeg", "jpg", "png", "gif")
+IMAGE_SIGNATURES: dict[bytes, str] = {
+    b"\xff\xd8\xff": "jpg",
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"GIF87a": "gif",
+    b"GIF89a": "gif",
+}
 INVALID_FILE: str = "Please upload a valid image."
 INVALID_TYPE: str = "The type of the image couldn't be determined."
+IMAGE_TOO_LARGE: str = "The image is too large."
 
 PAGINATION_SIZE: int = 6
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Table, UniqueConstraint
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Table, UniqueConstraint
 
 from application.database import Base
 from application.models import TimeStampMixin
@@ -9,6 +9,7 @@ recipe_tag = Table(
     Column("recipe_id", Integer, ForeignKey("recipe.id", ondelete="CASCADE")),
     Column("tag_id", Integer, ForeignKey("tag.id", ondelete="CASCADE")),
     UniqueConstraint("recipe_id", "tag_id", name="unique_for_recipe_tag"),
+    Index("ix_recipe_tag_tag_id_recipe_id", "tag_id", "recipe_id"),
 )
 
 
@@ -36,6 +36,9 @@ class TagOut(BaseSchema):
 
     @staticmethod
     async def tuple_to_dict(tags: tuple) -> dict[str, Any]:
+        """У рецепта без тегов внешнее соединение дает одну строку из `NULL`, она пропускается."""
         return [
-            {"id": pk, "name": name, "color": color, "slug": slug} for pk, name, color, slug in tags
+            {"id": pk, "name": name, "color": color, "slug": slug}
+            for pk, name, color, slug in tags
+            if pk is not None
         ]
@@ -5,15 +5,16 @@ from fastapi.responses import JSONResponse
 from starlette.status import HTTP_200_OK
 
 from application.auth.permissions import IsAdmin, IsAuthenticated, PermissionsDependency
+from application.cache import recipe_cache
 from application.exceptions import NotFoundException
-from application.managers import Manager
+from application.managers import CachedManager
 from application.schemas import SearchName
 from application.tags.models import Tag
 from application.tags.schemas import TagCreate, TagOut, TagUpdate
 
 router = APIRouter()
 admin_router = APIRouter()
-tag = Manager(Tag)
+tag = CachedManager(Tag)
 
 
 @admin_router.post("/", status_code=HTTP_200_OK)
@@ -41,16 +42,19 @@ async def details_tag(tag_id: int) -> Any:
 
 
 @admin_router.patch("/{tag_id}/", response_model=TagOut, status_code=HTTP_200_OK)
-async def update_tag(tag_id: int, tag_in: TagUpdate) -> JSONResponse:
+async def update_tag(tag_id: int, tag_in: TagUpdate) -> Any:
     """Редактировать теги может только администратор."""
     items = {k: v for k, v in tag_in.dict().items() if v}
-    return await tag.update(items=items, pk=tag_id)
+    result = await tag.update(items=items, pk=tag_id)
+    await recipe_cache.invalidate("recipe_list", "recipe_detail")
+    return result
 
 
 @admin_router.delete("/{tag_id}/", status_code=HTTP_200_OK)
 async def delete_tag(tag_id: int) -> JSONResponse:
     if not await tag.delete(pk=tag_id):
         raise NotFoundException("Тег не существует")
+    await recipe_cache.invalidate("recipe_list", "recipe_detail")
 
 
 router.include_router(
@@ -0,0 +1,107 @@
+"""
+Учет SQL запросов каждого HTTP запроса: количество, суммарное время в БД и самый медленный.
+Результат отдается заголовком `Server-Timing` и пишется в лог одной JSON строкой,
+запросы сверх `SQL_QUERY_BUDGET` пишутся с уровнем `WARNING`.
+"""
+
+import json
+import logging
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, ExceptionContext
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from application.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    __slots__ = ("count", "total", "slowest", "statement")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.statement = ""
+
+    def add(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.slowest:
+            self.slowest, self.statement = elapsed, statement
+
+    def server_timing(self, duration: float) -> str:
+        return (
+            f'db;desc="{self.count} queries";dur={self.total * 1000:.1f}, '
+            f"db-slowest;dur={self.slowest * 1000:.1f}, "
+            f"app;dur={duration * 1000:.1f}"
+        )
+
+
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn: Connection, *args: Any) -> None:
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn: Connection, cursor: Any, statement: str, *args: Any) -> None:
+    elapsed = perf_counter() - conn.info["query_start"].pop()
+    if stats := query_stats.get():
+        stats.add(statement, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def handle_error(context: ExceptionContext) -> None:
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+
+class QueryTimingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats, start, status = QueryStats(), perf_counter(), 500
+        token = query_stats.set(stats)
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_stats.reset(token)
+            over_budget = stats.count > settings.SQL_QUERY_BUDGET
+            logger.log(
+                logging.WARNING if over_budget else logging.INFO,
+                json.dumps(
+                    {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status,
+                        "duration_ms": round((perf_counter() - start) * 1000, 1),
+                        "queries": stats.count,
+                        "db_ms": round(stats.total * 1000, 1),
+                        "slowest_ms": round(stats.slowest * 1000, 1),
+                        "slowest_statement": stats.statement[:200],
+                        "over_budget": over_budget,
+                    },
+                    ensure_ascii=False,
+                ),
+            )
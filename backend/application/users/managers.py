@@ -1,31 +1,46 @@
 import logging
 from datetime import datetime
 
-from asyncpg import UniqueViolationError
 from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
+from application.cache import recipe_cache
 from application.database import scoped_session
-from application.recipes.models import Recipe
+from application.managers import CountManager
+from application.recipes.models import Favorite, IngredientOutbox, Recipe
 from application.schemas import SearchUser, SubParams
 from application.users.models import Follow, User
 from application.users.schemas import UserCreate, UserOut
+from application.utils import hash_password
 
 logger = logging.getLogger(__name__)
 
 
 class UserManager:
-    async def get_all(self, params: SearchUser, user_id: int | None = None) -> tuple[int, list]:
+    async def get_all(
+        self, params: SearchUser, user_id: int | None = None
+    ) -> tuple[int | None, list]:
         async with scoped_session() as session:
-            count = await params.count(User)
-            query = select(
-                *User.list_columns("id", "email", "username", "first_name", "last_name"),
-                Follow.is_subscribed(User.id, user_id),
-            ).where(User.is_active == True)
-            count, query = [await params.search(i) for i in (count, query)]
+            count_query = (await params.count(User)).where(User.is_active == True)
+            query = (
+                select(
+                    *User.list_columns("id", "email", "username", "first_name", "last_name"),
+                    Follow.is_subscribed(User.id, user_id),
+                )
+                .where(User.is_active == True)
+                .order_by(User.id)
+            )
+            count_query, query = [await params.search(i) for i in (count_query, query)]
             query = await session.execute(await params.limit_offset(query))
-            return await session.scalar(count), query.all()
+            results = await params.keyset_page(query.all())
+            if params.is_keyset:
+                return None, results
+
+            # `is_active` фильтрует всегда, оценка по `pg_class` посчитала бы и неактивных
+            count = await CountManager(User).count(session, count_query, params, filtered=True)
+            return count, results
 
     async def is_email(self, email: str) -> int | None:
         async with scoped_session() as session:
@@ -47,7 +62,15 @@ class UserManager:
     ) -> UserOut:
         query = await session.execute(
             select(
-                *User.list_columns("id", "email", "username", "first_name", "last_name"),
+                *User.list_columns(
+                    "id",
+                    "email",
+                    "username",
+                    "first_name",
+                    "last_name",
+                    "followers_count",
+                    "recipes_count",
+                ),
                 Follow.is_subscribed(author_id, user_id),
             ).where(User.id == author_id)
         )
@@ -59,10 +82,11 @@ class UserManager:
 
     async def create(self, user_in: UserCreate) -> User:
         async with scoped_session() as session:
-            query = await session.execute(
-                insert(User).values(**user_in.model_dump()).returning(User)
-            )
+            items = user_in.model_dump()
+            items["password"] = await hash_password(user_in.password)
+            query = await session.execute(insert(User).values(**items).returning(User))
             await session.commit()
+            await CountManager(User).invalidate()
             return query.scalar()
 
     async def update(self, password: bytes, user_id: int) -> int | None:
@@ -82,10 +106,30 @@ class UserManager:
                 return None
 
     async def delete(self, pk: int) -> bool:
+        """Перед удалением уменьшает счетчики подписчиков авторов и избранного рецептов,
+        записи которых удалятся каскадно вместе с пользователем."""
         async with scoped_session() as session:
             try:
-                await session.execute(delete(User).where(User.name == pk))
+                await session.execute(
+                    update(User)
+                    .where(User.id.in_(select(Follow.author_id).where(Follow.user_id == pk)))
+                    .values(followers_count=User.followers_count - 1)
+                )
+                await session.execute(
+                    update(Recipe)
+                    .where(Recipe.id.in_(select(Favorite.recipe_id).where(Favorite.user_id == pk)))
+                    .values(favorites_count=Recipe.favorites_count - 1)
+                )
+                await session.execute(
+                    insert(IngredientOutbox).from_select(
+                        ["recipe_id"], select(Recipe.id).where(Recipe.author_id == pk)
+                    )
+                )
+                await session.execute(delete(User).where(User.id == pk))
                 await session.commit()
+                await CountManager(User).invalidate()
+                await CountManager(Recipe).invalidate()
+                await recipe_cache.invalidate("recipe_list", "recipe_detail")
                 return True
             except Exception:
                 await session.rollback()
@@ -93,13 +137,23 @@ class UserManager:
 
 
 class FollowManager:
-    async def is_subscribed(self, request: Request, params: SubParams) -> tuple[int, list]:
+    @staticmethod
+    async def _followers_count(session: AsyncSession, author_id: int, delta: int) -> None:
+        await session.execute(
+            update(User)
+            .where(User.id == author_id)
+            .values(followers_count=User.followers_count + delta)
+        )
+
+    async def is_subscribed(self, request: Request, params: SubParams) -> tuple[int | None, list]:
         async with scoped_session() as session:
             user_id: int = request.user.id
-            count = await params.count(User)
+            count_query = (await params.count(User)).where(User.is_active == True)
             query = (
                 select(
-                    *User.list_columns("id", "email", "username", "first_name", "last_name"),
+                    *User.list_columns(
+                        "id", "email", "username", "first_name", "last_name", "recipes_count"
+                    ),
                     case((Follow.user_id == user_id, "True"), else_="False").label("is_subscribed"),
                     Recipe.json_agg_recipes_limit(request, params.recipes_limit),
                 )
@@ -107,35 +161,46 @@ class FollowManager:
                 .group_by(User.id, Follow.user_id)
                 .order_by(User.username)
             )
-            count, query = [
+            count_query, query = [
                 i.join(Follow, User.id == Follow.author_id).where(
                     Follow.user_id == user_id, User.is_active == True
                 )
-                for i in (count, query)
+                for i in (count_query, query)
             ]
-            count = await session.scalar(count)
-            if not count:
-                return 0, []
+            count: int | None = None
+            if not params.is_keyset:
+                count = await session.scalar(count_query)
+                if not count:
+                    return 0, []
 
-            query = await session.execute(query)
-            return count, await params.to_dict(query.all())
+            query = await session.execute(await params.limit_offset(query))
+            return count, await params.to_dict(await params.keyset_page(query.all()))
 
     async def create(self, author_id: int, user_id: int) -> bool:
         async with scoped_session() as session:
-            try:
-                await session.execute(insert(Follow).values(author_id=author_id, user_id=user_id))
-                await session.commit()
-                return True
-            except UniqueViolationError as e:
-                logger.error(e)
+            created = await session.scalar(
+                pg_insert(Follow)
+                .values(author_id=author_id, user_id=user_id)
+                .on_conflict_do_nothing()
+                .returning(Follow.author_id)
+            )
+            if created is None:
                 return False
+            await self._followers_count(session, author_id, 1)
+            await session.commit()
+            return True
 
     async def delete(self, author_id: int, user_id: int) -> bool | None:
         async with scoped_session() as session:
             try:
-                await session.execute(
-                    delete(Follow).where(Follow.author_id == author_id, Follow.user_id == user_id)
+                deleted = await session.scalar(
+                    delete(Follow)
+                    .where(Follow.author_id == author_id, Follow.user_id == user_id)
+                    .returning(Follow.author_id)
                 )
+                if deleted is None:
+                    return False
+                await self._followers_count(session, author_id, -1)
                 await session.commit()
                 return True
             except Exception as e:
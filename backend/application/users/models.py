@@ -1,23 +1,30 @@
-import bcrypt
+from typing import cast
+
 from sqlalchemy import (
     Boolean,
     Column,
     ForeignKey,
+    Index,
     Integer,
     LargeBinary,
     String,
     UniqueConstraint,
     case,
+    exists,
+    false,
     func,
     select,
 )
-from sqlalchemy.sql.expression import Label
+from sqlalchemy.sql.expression import ColumnElement, Label
 
 from application.database import Base
 from application.models import TimeStampMixin
+from application.utils import check_password
 
 
 class User(Base, TimeStampMixin):
+    __table_args__ = (Index("ix_user_username_id", "username", "id"),)
+
     id = Column(Integer, primary_key=True)
     email = Column(String(255), nullable=False, unique=True, index=True)
     password = Column(LargeBinary, nullable=False)
@@ -29,8 +36,11 @@ class User(Base, TimeStampMixin):
     is_staff = Column(Boolean, nullable=False, default=False)
     is_superuser = Column(Boolean, nullable=False, default=False)
 
+    followers_count = Column(Integer, nullable=False, default=0, server_default="0")
+    recipes_count = Column(Integer, nullable=False, default=0, server_default="0")
+
     async def check_password(self, password: str) -> bool:
-        return bcrypt.checkpw(password.encode("utf-8"), self.password)
+        return await check_password(password, cast(bytes, self.password))
 
 
 class Follow(Base, TimeStampMixin):
@@ -50,3 +60,14 @@ class Follow(Base, TimeStampMixin):
             cls.user_id == user_id, cls.author_id == author_id
         )
         return case((sub.c.is_subscribed != 0, "True"), else_="False").label("is_subscribed")
+
+    @classmethod
+    def exists_subscribed(cls, author_id: ColumnElement, user_id: int | None = None) -> Label:
+        """Коррелированный `EXISTS`: подписан ли пользователь на автора из внешнего запроса."""
+        if not user_id:
+            return false().label("is_subscribed")
+        return (
+            exists()
+            .where(cls.author_id == author_id, cls.user_id == user_id)
+            .label("is_subscribed")
+        )
@@ -1,9 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field, StringConstraints, field_validator, model_validator
+from pydantic import BaseModel, EmailStr, Field, StringConstraints, model_validator
 from typing_extensions import Annotated
 
 from application.exceptions import BadRequestException
-from application.schemas import BaseSchema, name_en_str, name_str
-from application.utils import hash_password
+from application.schemas import BaseSchema, ImageVariantsMixin, name_en_str, name_str
 
 
 class UserRegistration(BaseModel):
@@ -18,7 +17,7 @@ class UserCreate(BaseModel):
     first_name: Annotated[str, StringConstraints(pattern=name_str, min_length=1, max_length=150)]
     last_name: Annotated[str, StringConstraints(pattern=name_str, min_length=1, max_length=150)]
     email: EmailStr
-    password: str | bytes = Field(min_length=7)
+    password: str = Field(min_length=7)
 
     class ConfigDict:
         str_strip_whitespace = True
@@ -32,11 +31,6 @@ class UserCreate(BaseModel):
             }
         }
 
-    @field_validator("password")
-    @classmethod
-    def hash(cls, v: str) -> bytes:
-        return hash_password(v)
-
 
 class UserOut(BaseSchema):
     email: EmailStr
@@ -46,6 +40,11 @@ class UserOut(BaseSchema):
     is_subscribed: bool | None = False
 
 
+class ProfileOut(UserOut):
+    followers_count: int = 0
+    recipes_count: int = 0
+
+
 class UserBase(BaseSchema):
     username: str
     first_name: str
@@ -53,7 +52,7 @@ class UserBase(BaseSchema):
     is_subscribed: bool = False
 
 
-class FavoriteOut(BaseSchema):
+class FavoriteOut(BaseSchema, ImageVariantsMixin):
     id: int
     name: str
     image: str
@@ -85,5 +84,4 @@ class SetPassword(BaseModel):
     def validator(self) -> "SetPassword":
         if self.current_password == self.new_password:
             raise BadRequestException("Incorrect password")
-        self.new_password = hash_password(self.new_password)
         return self
@@ -9,7 +9,8 @@ from application.managers import Manager
 from application.schemas import Result, SearchUser, SubParams
 from application.users.managers import FollowManager, UserManager
 from application.users.models import User
-from application.users.schemas import FollowOut, SetPassword, UserCreate, UserOut
+from application.users.schemas import FollowOut, ProfileOut, SetPassword, UserCreate, UserOut
+from application.utils import hash_password
 
 router = APIRouter()
 
@@ -38,7 +39,7 @@ async def create_user(user_in: UserCreate) -> UserOut:
 
 @router.get(
     "/me/",
-    response_model=UserOut,
+    response_model=ProfileOut,
     dependencies=[Depends(PermissionsDependency([IsAuthenticated]))],
     status_code=HTTP_200_OK,
 )
@@ -70,8 +71,9 @@ async def set_password(request: Request, password_in: SetPassword) -> JSONRespon
     """Изменение пароля пользователя.<br>
     Администратор может изменять пароль любого пользователя."""
     user: User = await Manager(User).by_id(request.user.id)
-    if user.check_password(password_in.current_password):
-        if await UserManager().update(password_in.new_password, request.user.id):
+    if await user.check_password(password_in.current_password):
+        password = await hash_password(password_in.new_password)
+        if await UserManager().update(password, request.user.id):
             return Response(status_code=HTTP_204_NO_CONTENT)
 
     raise BadRequestException("Неверный пароль")
@@ -90,7 +92,7 @@ async def delete_user(user_id: int) -> JSONResponse:
     raise BadRequestException("Ошибка отписки (Например, пользователь уже удален).")
 
 
-@router.get("/{user_id}/", response_model=UserOut, status_code=HTTP_200_OK)
+@router.get("/{user_id}/", response_model=ProfileOut, status_code=HTTP_200_OK)
 async def get_user(request: Request, user_id: int) -> UserOut | JSONResponse:
     """Профиль пользователя. Доступно всем пользователям."""
     if result := await UserManager().by_id(user_id, request.user.id):
@@ -1,6 +1,33 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
+from application.settings import settings
+
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.BCRYPT_MAX_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+
+
+def _hashpw(password: str) -> bytes:
+    return bcrypt.hashpw(bytes(password, "utf-8"), bcrypt.gensalt(settings.BCRYPT_ROUNDS))
+
+
+def _checkpw(password: str, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password)
+
+
+async def hash_password(password: str) -> bytes:
+    """Генерирует хэшированную версию предоставленного пароля.
+    bcrypt отпускает GIL, поэтому хэширование выполняется в отдельном ограниченном пуле потоков
+    и не блокирует цикл событий."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, _hashpw, password)
+
 
-def hash_password(password: str) -> bytes:
-    """Генерирует хэшированную версию предоставленного пароля."""
-    return bcrypt.hashpw(bytes(password, "utf-8"), bcrypt.gensalt())
+async def check_password(password: str, hashed_password: bytes) -> bool:
+    """Сверяет пароль с хэшем в пуле потоков `password_executor`."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, _checkpw, password, hashed_password)
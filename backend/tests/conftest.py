@@ -0,0 +1,203 @@
+import asyncio
+from itertools import count
+from typing import AsyncIterator, Iterator
+from urllib.parse import urlparse
+
+import httpx
+import pytest
+from fastapi import APIRouter, Body, FastAPI
+from sqlalchemy import insert, text, update
+
+from application.cache import recipe_cache
+from application.database import scoped_session, sessionmanager
+from application.main import create_app
+from application.managers import CachedManager, CountManager
+from application.recipes.models import Recipe
+from application.services import httpclient
+from application.settings import settings, settings_test
+from application.tags.models import Tag, recipe_tag
+from application.users.models import User
+from application.utils import hash_password
+
+PASSWORD = "test-password"
+
+numbers = count(1)
+
+
+class FakeIngredients:
+    """API рецептов сервиса ингредиентов в памяти теста."""
+
+    def __init__(self) -> None:
+        self.catalog = {
+            pk: {"id": pk, "name": f"Ингредиент {pk}", "measurement_unit": "г"}
+            for pk in range(1, 11)
+        }
+        self.recipes: dict[int, list[dict]] = {}
+
+    def amounts(self, ingredients: list[dict]) -> list[dict]:
+        return [
+            {**self.catalog[item["ingredient_id"]], "amount": item["amount"]}
+            for item in ingredients
+        ]
+
+    def app(self) -> FastAPI:
+        router = APIRouter()
+
+        @router.post("/batch/")
+        async def batch(recipes: list[dict] = Body()) -> list[int]:
+            rejected = []
+            for recipe in recipes:
+                if recipe["ingredients"] is None:
+                    self.recipes.pop(recipe["id"], None)
+                elif all(item["ingredient_id"] in self.catalog for item in recipe["ingredients"]):
+                    self.recipes[recipe["id"]] = self.amounts(recipe["ingredients"])
+                else:
+                    rejected.append(recipe["id"])
+            return rejected
+
+        @router.post("/lookup/")
+        async def lookup(ingredient_ids: list[int] = Body()) -> list[dict]:
+            return [self.catalog[pk] for pk in ingredient_ids if pk in self.catalog]
+
+        @router.post("/bulk/")
+        async def bulk(recipe_ids: list[int] = Body()) -> dict[int, list]:
+            return {pk: self.recipes[pk] for pk in recipe_ids if pk in self.recipes}
+
+        @router.get("/{recipe_id}/")
+        async def detail(recipe_id: int) -> list[dict]:
+            return self.recipes.get(recipe_id, [])
+
+        fake = FastAPI()
+        fake.include_router(router, prefix=urlparse(settings.INGREDIENTS_URL).path.rstrip("/"))
+        return fake
+
+
+@pytest.fixture(scope="session")
+def event_loop() -> Iterator[asyncio.AbstractEventLoop]:
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def connection_test() -> AsyncIterator[None]:
+    settings.BCRYPT_ROUNDS = 4
+    sessionmanager.init(settings_test.SQLALCHEMY_DATABASE_URI_TEST)
+    yield
+    await sessionmanager.close()
+
+
+@pytest.fixture(autouse=True)
+async def create_tables(connection_test: None) -> AsyncIterator[None]:
+    async with sessionmanager.connect() as connection:
+        await connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await sessionmanager.drop_all(connection)
+        await sessionmanager.create_all(connection)
+
+    await CachedManager(Tag).invalidate()
+    await CountManager(Recipe).invalidate()
+    await CountManager(User).invalidate()
+    await recipe_cache.invalidate("recipe_list", "recipe_detail")
+    yield
+
+
+@pytest.fixture
+def ingredients() -> FakeIngredients:
+    return FakeIngredients()
+
+
+@pytest.fixture
+async def client(ingredients: FakeIngredients) -> AsyncIterator[httpx.AsyncClient]:
+    httpclient.init(settings.INGREDIENTS_URL, httpx.ASGITransport(app=ingredients.app()))
+    app = create_app(init_db=False)
+    async with httpx.AsyncClient(
+        base_url=f"http://test{settings.API_V1_STR}", transport=httpx.ASGITransport(app=app)
+    ) as client:
+        yield client
+    await httpclient.close()
+
+
+@pytest.fixture
+def make_user(client: httpx.AsyncClient):
+    """Пользователь напрямую в БД, возвращает его id и заголовки авторизации."""
+
+    async def make_user(is_staff: bool = False) -> tuple[int, dict[str, str]]:
+        number = next(numbers)
+        email = f"user{number}@example.com"
+        async with scoped_session() as session:
+            user_id = await session.scalar(
+                insert(User)
+                .values(
+                    email=email,
+                    username=f"user{number}",
+                    first_name="Тест",
+                    last_name="Тестов",
+                    password=await hash_password(PASSWORD),
+                    is_staff=is_staff,
+                )
+                .returning(User.id)
+            )
+            await session.commit()
+
+        response = await client.post(
+            "/auth/token/login/", json={"email": email, "password": PASSWORD}
+        )
+        return user_id, {"Authorization": f"Token {response.json()['auth_token']}"}
+
+    return make_user
+
+
+@pytest.fixture
+def make_tags():
+    async def make_tags(*slugs: str) -> dict[str, int]:
+        async with scoped_session() as session:
+            query = await session.execute(
+                insert(Tag)
+                .values(
+                    [
+                        {"name": slug, "color": f"{number:06d}", "slug": slug}
+                        for number, slug in enumerate(slugs)
+                    ]
+                )
+                .returning(Tag.slug, Tag.id)
+            )
+            await session.commit()
+        await CachedManager(Tag).invalidate()
+        return dict(query.all())
+
+    return make_tags
+
+
+@pytest.fixture
+def make_recipe():
+    """Рецепт напрямую в БД, без картинки и сервиса ингредиентов."""
+
+    async def make_recipe(author_id: int, tag_ids: list[int] = ()) -> int:
+        number = next(numbers)
+        async with scoped_session() as session:
+            recipe_id = await session.scalar(
+                insert(Recipe)
+                .values(
+                    author_id=author_id,
+                    name=f"Рецепт {number}",
+                    image=f"recipe-{number}.png",
+                    text="Описание",
+                    cooking_time=10,
+                )
+                .returning(Recipe.id)
+            )
+            if tag_ids:
+                await session.execute(
+                    insert(recipe_tag).values(
+                        [{"recipe_id": recipe_id, "tag_id": pk} for pk in tag_ids]
+                    )
+                )
+            await session.execute(
+                update(User)
+                .where(User.id == author_id)
+                .values(recipes_count=User.recipes_count + 1)
+            )
+            await session.commit()
+        return recipe_id
+
+    return make_recipe
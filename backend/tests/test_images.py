@@ -0,0 +1,44 @@
+import os
+
+import pytest
+from PIL import Image
+
+from application.recipes import images
+from application.settings import settings
+
+
+@pytest.fixture
+def media_root(monkeypatch, tmp_path) -> str:
+    monkeypatch.setattr(images, "MEDIA_ROOT", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_SIZES", {"list": 8})
+    monkeypatch.setattr(settings, "IMAGE_FORMATS", ["webp"])
+    return str(tmp_path)
+
+
+def test_render_variants_keeps_palette_transparency(media_root) -> None:
+    image = Image.new("P", (16, 16), 0)
+    image.putpalette([255, 255, 255, 200, 0, 0] + [0] * 762)
+    image.paste(1, (4, 4, 12, 12))
+    image.save(os.path.join(media_root, "recipe.png"), transparency=0)
+
+    assert images.render_variants("recipe.png") == {"list": {"webp": "recipe_list.webp"}}
+
+    with Image.open(os.path.join(media_root, "recipe.png")) as original:
+        assert original.info.get("transparency") == 0
+    with Image.open(os.path.join(media_root, "recipe_list.webp")) as variant:
+        assert variant.mode == "RGBA"
+        assert variant.getpixel((0, 0))[3] == 0
+
+
+def test_render_variants_strips_exif(media_root) -> None:
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    Image.new("RGB", (20, 10), (200, 0, 0)).save(
+        os.path.join(media_root, "recipe.jpg"), exif=exif.tobytes()
+    )
+
+    images.render_variants("recipe.jpg")
+
+    with Image.open(os.path.join(media_root, "recipe.jpg")) as original:
+        assert "exif" not in original.info
+        assert original.size == (10, 20)
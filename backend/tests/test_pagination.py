@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import text
+
+from application.database import scoped_session
+from application.settings import settings
+
+
+async def walk(client, url: str, params: dict, headers: dict | None = None) -> list[int]:
+    """Id всех объектов списка по ссылкам `next`."""
+    ids: list[int] = []
+    response = await client.get(url, params=params, headers=headers)
+    while True:
+        assert response.status_code == 200
+        ids.extend(item["id"] for item in response.json()["results"])
+        if not (next_url := response.json()["next"]):
+            return ids
+        response = await client.get(next_url, headers=headers)
+
+
+@pytest.mark.parametrize("authenticated", [False, True])
+async def test_recipes_keyset_pages_match_offset_pages(
+    client, make_user, make_recipe, authenticated
+) -> None:
+    author_id, headers = await make_user()
+    created = [await make_recipe(author_id) for _ in range(7)]
+    headers = headers if authenticated else None
+
+    by_offset = await walk(client, "/recipes/", {"limit": 3}, headers)
+    by_keyset = await walk(client, "/recipes/", {"limit": 3, "keyset": True}, headers)
+
+    assert by_keyset == by_offset == created[::-1]
+
+
+async def test_recipes_keyset_page_has_no_count(client, make_user, make_recipe) -> None:
+    author_id, _ = await make_user()
+    for _ in range(2):
+        await make_recipe(author_id)
+
+    response = await client.get("/recipes/", params={"limit": 1, "keyset": True})
+    assert response.json()["count"] is None
+    assert "cursor=" in response.json()["next"]
+    assert response.json()["previous"] is None
+
+
+async def test_subscriptions_keyset_pages_match_offset_pages(
+    client, make_user, make_recipe
+) -> None:
+    _, headers = await make_user()
+    for _ in range(5):
+        author_id, _ = await make_user()
+        await make_recipe(author_id)
+        response = await client.post(f"/users/{author_id}/subscribe/", headers=headers)
+        assert response.status_code == 201
+
+    by_offset = await walk(client, "/users/subscriptions/", {"limit": 2}, headers)
+    by_keyset = await walk(client, "/users/subscriptions/", {"limit": 2, "keyset": True}, headers)
+
+    assert by_keyset == by_offset
+    assert len(set(by_keyset)) == 5
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "W10=", "WyJub3QgYSBkYXRlIiwgMSwgMl0="])
+async def test_recipes_bad_cursor(client, cursor) -> None:
+    response = await client.get("/recipes/", params={"cursor": cursor})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("strategy", ["exact", "cached", "estimate"])
+async def test_recipes_count_strategies(
+    client, make_user, make_tags, make_recipe, monkeypatch, strategy
+) -> None:
+    monkeypatch.setattr(settings, "COUNT_STRATEGY", strategy)
+    author_id, headers = await make_user()
+    tags = await make_tags("breakfast")
+    recipe_ids = [await make_recipe(author_id, [tags["breakfast"]]) for _ in range(2)]
+    await make_recipe(author_id)
+    async with scoped_session() as session:
+        await session.execute(text("ANALYZE recipe"))
+
+    async def count(**params) -> int:
+        response = await client.get("/recipes/", params={"limit": 1, **params}, headers=headers)
+        return response.json()["count"]
+
+    assert await count() == 3
+    assert await count(tags=["breakfast"]) == 2
+
+    response = await client.delete(f"/recipes/{recipe_ids[0]}/", headers=headers)
+    assert response.status_code == 204
+    assert await count(tags=["breakfast"]) == 1
+    async with scoped_session() as session:
+        await session.execute(text("ANALYZE recipe"))
+    assert await count() == 2
+
+
+async def test_recipes_cached_count_reused_until_invalidated(
+    client, make_user, make_recipe, monkeypatch
+) -> None:
+    monkeypatch.setattr(settings, "COUNT_STRATEGY", "cached")
+    author_id, headers = await make_user()
+    await make_recipe(author_id)
+
+    response = await client.get("/recipes/", headers=headers)
+    assert response.json()["count"] == 1
+
+    # `make_recipe` пишет в БД напрямую и не сбрасывает кэш количества
+    recipe_id = await make_recipe(author_id)
+    response = await client.get("/recipes/", headers=headers)
+    assert response.json()["count"] == 1
+
+    response = await client.delete(f"/recipes/{recipe_id}/", headers=headers)
+    assert response.status_code == 204
+    await make_recipe(author_id)
+    response = await client.get("/recipes/", headers=headers)
+    assert response.json()["count"] == 2
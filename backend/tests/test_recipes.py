@@ -0,0 +1,287 @@
+import asyncio
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import func, select
+
+from application.cache import recipe_cache
+from application.database import scoped_session, sessionmanager
+from application.recipes import managers, views
+from application.recipes.managers import outbox
+from application.recipes.models import IngredientOutbox
+from application.services import httpclient
+from application.settings import settings
+
+
+@pytest.fixture
+async def recipes(client, make_user, make_tags, make_recipe) -> tuple[dict, dict[str, int]]:
+    """Четыре рецепта с разными тегами, два в избранном и два в списке покупок."""
+    author_id, _ = await make_user()
+    user_id, headers = await make_user()
+    tags = await make_tags("breakfast", "lunch", "dinner")
+    ids = {
+        "breakfast": await make_recipe(author_id, [tags["breakfast"]]),
+        "breakfast_lunch": await make_recipe(author_id, [tags["breakfast"], tags["lunch"]]),
+        "lunch_dinner": await make_recipe(author_id, [tags["lunch"], tags["dinner"]]),
+        "untagged": await make_recipe(author_id),
+    }
+    for name in ("breakfast", "lunch_dinner"):
+        response = await client.post(f"/recipes/{ids[name]}/favorite/", headers=headers)
+        assert response.status_code == 201
+    for name in ("breakfast_lunch", "lunch_dinner"):
+        response = await client.post(f"/recipes/{ids[name]}/shopping_cart/", headers=headers)
+        assert response.status_code == 201
+    return headers, ids
+
+
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ({}, {"breakfast", "breakfast_lunch", "lunch_dinner", "untagged"}),
+        ({"tags": ["breakfast", "lunch"]}, {"breakfast_lunch"}),
+        (
+            {"tags": ["breakfast", "lunch"], "tags_match": "any"},
+            {"breakfast", "breakfast_lunch", "lunch_dinner"},
+        ),
+        ({"tags": ["breakfast", "unknown"]}, set()),
+        ({"tags": ["breakfast", "unknown"], "tags_match": "any"}, {"breakfast", "breakfast_lunch"}),
+        ({"is_favorited": True}, {"breakfast", "lunch_dinner"}),
+        ({"is_in_shopping_cart": True}, {"breakfast_lunch", "lunch_dinner"}),
+        ({"is_favorited": True, "is_in_shopping_cart": True}, {"lunch_dinner"}),
+        ({"is_favorited": True, "tags": ["lunch"]}, {"lunch_dinner"}),
+        ({"is_in_shopping_cart": True, "tags": ["dinner"], "tags_match": "any"}, {"lunch_dinner"}),
+    ],
+)
+async def test_recipes_filters_count_matches_results(client, recipes, params, expected) -> None:
+    headers, ids = recipes
+
+    response = await client.get("/recipes/", params={**params, "limit": 100}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert {recipe["id"] for recipe in data["results"]} == {ids[name] for name in expected}
+    assert data["count"] == len(data["results"])
+
+    response = await client.get("/recipes/", params={**params, "limit": 1}, headers=headers)
+    assert response.json()["count"] == len(expected)
+
+
+async def test_recipes_flags_of_authenticated_user(client, recipes) -> None:
+    headers, ids = recipes
+
+    response = await client.get("/recipes/", params={"limit": 100}, headers=headers)
+    flags = {
+        recipe["id"]: (recipe["is_favorited"], recipe["is_in_shopping_cart"])
+        for recipe in response.json()["results"]
+    }
+    assert flags == {
+        ids["breakfast"]: (True, False),
+        ids["breakfast_lunch"]: (False, True),
+        ids["lunch_dinner"]: (True, True),
+        ids["untagged"]: (False, False),
+    }
+
+
+async def test_recipes_anonymous_flags_filter_rejected(client, recipes) -> None:
+    response = await client.get("/recipes/", params={"is_favorited": True})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("by_staff", [False, True])
+async def test_delete_recipe_decrements_recipes_count(
+    client, make_user, make_recipe, by_staff
+) -> None:
+    author_id, headers = await make_user()
+    recipe_id = await make_recipe(author_id)
+    await make_recipe(author_id)
+    if by_staff:
+        _, headers = await make_user(is_staff=True)
+
+    response = await client.delete(f"/recipes/{recipe_id}/", headers=headers)
+    assert response.status_code == 204
+
+    response = await client.get(f"/users/{author_id}/")
+    assert response.json()["recipes_count"] == 1
+    response = await client.get(f"/recipes/{recipe_id}/")
+    assert response.status_code == 404
+
+
+async def test_delete_missing_recipe(client, make_user) -> None:
+    _, headers = await make_user()
+    response = await client.delete("/recipes/404/", headers=headers)
+    assert response.status_code == 404
+
+
+async def test_recipes_without_ingredients_service(client, make_user, make_recipe) -> None:
+    author_id, headers = await make_user()
+    recipe_id = await make_recipe(author_id)
+
+    def unavailable(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("unavailable", request=request)
+
+    await httpclient.close()
+    httpclient.init(settings.INGREDIENTS_URL, httpx.MockTransport(unavailable))
+
+    response = await client.get(f"/recipes/{recipe_id}/", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["ingredients"] == []
+    response = await client.get("/recipes/", params={"with_ingredients": True}, headers=headers)
+    assert response.status_code == 200
+    assert not response.json()["results"][0]["ingredients"]
+
+
+@pytest.fixture
+def recipe_in(monkeypatch, make_tags):
+    """Тело создания рецепта, картинка не пишется на диск и не обрабатывается."""
+
+    async def recipe_image(image: str, user_id: int) -> tuple[str, str]:
+        return image, ""
+
+    async def process_image(recipe_id: int, filename: str) -> None:
+        pass
+
+    monkeypatch.setattr(views, "recipe_image", recipe_image)
+    monkeypatch.setattr(views, "process_image", process_image)
+
+    async def recipe_in(ingredients: list[dict]) -> dict:
+        tags = await make_tags(f"tag{len(ingredients)}")
+        return {
+            "name": "Рецепт",
+            "text": "Описание",
+            "image": "recipe.png",
+            "cooking_time": 10,
+            "ingredients": ingredients,
+            "tags": list(tags.values()),
+        }
+
+    return recipe_in
+
+
+async def test_create_recipe_returns_ingredients(client, make_user, recipe_in) -> None:
+    _, headers = await make_user()
+    data = await recipe_in([{"id": 1, "amount": 2}, {"id": 3, "amount": "5"}])
+
+    response = await client.post("/recipes/", json=data, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["ingredients"] == [
+        {"id": 1, "name": "Ингредиент 1", "measurement_unit": "г", "amount": 2},
+        {"id": 3, "name": "Ингредиент 3", "measurement_unit": "г", "amount": 5},
+    ]
+
+
+@pytest.mark.parametrize(
+    "items, status_code",
+    [
+        ([{"id": 1, "amount": 0}], 422),
+        ([{"id": 1, "amount": -3}], 422),
+        ([{"id": 404, "amount": 1}], 400),
+        ([{"id": 1, "amount": 1}, {"id": 1, "amount": 2}], 400),
+    ],
+)
+async def test_create_recipe_invalid_ingredients(
+    client, make_user, recipe_in, items, status_code
+) -> None:
+    _, headers = await make_user()
+
+    response = await client.post("/recipes/", json=await recipe_in(items), headers=headers)
+    assert response.status_code == status_code
+    async with scoped_session() as session:
+        assert not await session.scalar(select(func.count()).select_from(IngredientOutbox))
+    response = await client.get("/recipes/")
+    assert response.json()["count"] == 0
+
+
+async def test_outbox_rejected_kept_until_accepted(
+    client, ingredients, make_user, recipe_in
+) -> None:
+    _, headers = await make_user()
+    _, staff_headers = await make_user(is_staff=True)
+    response = await client.post(
+        "/recipes/", json=await recipe_in([{"id": 10, "amount": 1}]), headers=headers
+    )
+    recipe_id = response.json()["id"]
+    del ingredients.catalog[10]
+
+    assert await outbox.dispatch() == 1
+    response = await client.get("/recipes/outbox/rejected/", headers=staff_headers)
+    assert response.status_code == 200
+    assert [(row["recipe_id"], row["ingredients"]) for row in response.json()] == [
+        (recipe_id, [{"recipe_id": recipe_id, "ingredient_id": 10, "amount": 1}])
+    ]
+    assert await outbox.dispatch() == 0
+    response = await client.get("/recipes/outbox/rejected/", headers=headers)
+    assert response.status_code == 403
+
+    response = await client.patch(
+        f"/recipes/{recipe_id}/", json={"ingredients": [{"id": 2, "amount": 4}]}, headers=headers
+    )
+    assert response.status_code == 200
+    assert await outbox.dispatch() == 1
+    response = await client.get("/recipes/outbox/rejected/", headers=staff_headers)
+    assert response.json() == []
+    assert ingredients.recipes[recipe_id] == ingredients.amounts(
+        [{"ingredient_id": 2, "amount": 4}]
+    )
+
+
+async def test_outbox_dispatch_releases_connection_during_call(
+    client, make_user, recipe_in, monkeypatch
+) -> None:
+    _, headers = await make_user()
+    await client.post("/recipes/", json=await recipe_in([{"id": 1, "amount": 1}]), headers=headers)
+    seen = {}
+
+    async def post_batch_ingredients(in_data: list[dict], idempotency_key: str) -> None:
+        seen["checked_out"] = sessionmanager.pool_status()[settings.SCHEMA_NAME]["checked_out"]
+        seen["concurrent"] = await outbox.dispatch()
+
+    monkeypatch.setattr(managers, "post_batch_ingredients", post_batch_ingredients)
+    assert await outbox.dispatch() == 0
+    assert seen == {"checked_out": 0, "concurrent": 0}
+    async with scoped_session() as session:
+        assert await session.scalar(select(IngredientOutbox.attempts)) == 1
+
+
+async def test_favorite_invalidates_cached_favorites_count(client, make_user, make_recipe) -> None:
+    author_id, headers = await make_user()
+    recipe_id = await make_recipe(author_id)
+    hits = (
+        REGISTRY.get_sample_value("response_cache_hits_total", {"prefix": recipe_cache.prefix}) or 0
+    )
+
+    for expected in (0, 0):
+        response = await client.get(f"/recipes/{recipe_id}/")
+        assert response.json()["favorites_count"] == expected
+    assert response.headers["X-Cache"] == "HIT"
+    assert (
+        REGISTRY.get_sample_value("response_cache_hits_total", {"prefix": recipe_cache.prefix})
+        == hits + 1
+    )
+    response = await client.get("/recipes/")
+    assert response.json()["results"][0]["favorites_count"] == 0
+
+    await client.post(f"/recipes/{recipe_id}/favorite/", headers=headers)
+    response = await client.get(f"/recipes/{recipe_id}/")
+    assert response.json()["favorites_count"] == 1
+    response = await client.get("/recipes/")
+    assert response.json()["results"][0]["favorites_count"] == 1
+
+    await client.delete(f"/recipes/{recipe_id}/favorite/", headers=headers)
+    response = await client.get(f"/recipes/{recipe_id}/")
+    assert response.json()["favorites_count"] == 0
+
+
+async def test_concurrent_duplicates_counted_once(client, make_user, make_recipe) -> None:
+    author_id, _ = await make_user()
+    _, headers = await make_user()
+    recipe_id = await make_recipe(author_id)
+
+    responses = await asyncio.gather(
+        *(client.post(f"/recipes/{recipe_id}/favorite/", headers=headers) for _ in range(2)),
+        *(client.post(f"/users/{author_id}/subscribe/", headers=headers) for _ in range(2)),
+    )
+    assert sorted(response.status_code for response in responses) == [201, 201, 400, 400]
+    response = await client.get(f"/recipes/{recipe_id}/")
+    assert response.json()["favorites_count"] == 1
+    response = await client.get(f"/users/{author_id}/")
+    assert response.json()["followers_count"] == 1
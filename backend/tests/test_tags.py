@@ -0,0 +1,9 @@
+async def test_tag_detail_from_database_and_cache(client, make_tags) -> None:
+    tag_id = (await make_tags("breakfast"))["breakfast"]
+
+    responses = [await client.get(f"/tags/{tag_id}/") for _ in range(2)]
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[0].json() == responses[1].json()
+    assert responses[0].json()["slug"] == "breakfast"
+    assert (await client.get(f"/tags/{tag_id + 1}/")).status_code == 404
@@ -0,0 +1,79 @@
+import base64
+import os
+
+import pytest
+from starlette.exceptions import HTTPException
+
+from application.recipes import utils, views
+from application.settings import settings
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture
+def upload_root(monkeypatch, tmp_path) -> str:
+    monkeypatch.setattr(views, "UPLOAD_ROOT", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_MAX_SIZE", 64)
+    monkeypatch.setattr(settings, "IMAGE_CHUNK_SIZE", 6)
+    return str(tmp_path)
+
+
+async def test_upload_image_within_limit(client, make_user, upload_root) -> None:
+    _, headers = await make_user()
+    body = PNG + b"\0" * 56
+
+    response = await client.post("/recipes/images/", content=body, headers=headers)
+
+    assert response.status_code == 201
+    assert response.json()["size"] == 64
+    assert os.listdir(upload_root) == [response.json()["image"]]
+
+
+async def test_upload_image_rejects_content_length(client, make_user, upload_root) -> None:
+    _, headers = await make_user()
+
+    response = await client.post("/recipes/images/", content=PNG + b"\0" * 57, headers=headers)
+
+    assert response.status_code == 413
+    assert os.listdir(upload_root) == []
+
+
+async def test_upload_image_rejects_stream_over_limit(client, make_user, upload_root) -> None:
+    """Без `Content-Length` размер проверяется по ходу записи, часть файла удаляется."""
+    _, headers = await make_user()
+
+    async def body():
+        yield PNG
+        for _ in range(10):
+            yield b"\0" * 8
+
+    response = await client.post("/recipes/images/", content=body(), headers=headers)
+
+    assert response.status_code == 413
+    assert os.listdir(upload_root) == []
+
+
+async def test_base64_image_over_limit(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(settings, "IMAGE_MAX_SIZE", 64)
+    monkeypatch.setattr(settings, "IMAGE_CHUNK_SIZE", 6)
+    data = base64.b64encode(PNG + b"\0" * 100).decode()
+
+    with pytest.raises(HTTPException) as error:
+        await utils.save_image(utils.base64_chunks(data), str(tmp_path))
+
+    assert error.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("wrap", [3, 76])
+async def test_base64_chunks_skips_line_breaks(monkeypatch, wrap) -> None:
+    monkeypatch.setattr(settings, "IMAGE_CHUNK_SIZE", 6)
+    raw = os.urandom(100)
+    encoded = base64.b64encode(raw).decode()
+    wrapped = "\n".join(encoded[i : i + wrap] for i in range(0, len(encoded), wrap))
+    data = "data:image/png;base64," + wrapped
+
+    chunks = [chunk async for chunk in utils.base64_chunks(data, data.find(",") + 1)]
+
+    assert b"".join(chunks) == raw
+    assert {len(chunk) for chunk in chunks[:-1]} == {6}
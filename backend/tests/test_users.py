@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import text, update
+
+from application.database import scoped_session
+from application.settings import settings
+from application.users.models import User
+
+
+@pytest.mark.parametrize("strategy", ["exact", "cached", "estimate"])
+async def test_users_count_skips_inactive(client, make_user, monkeypatch, strategy) -> None:
+    monkeypatch.setattr(settings, "COUNT_STRATEGY", strategy)
+    for _ in range(3):
+        inactive_id, _ = await make_user()
+    async with scoped_session() as session:
+        await session.execute(update(User).where(User.id == inactive_id).values(is_active=False))
+        await session.commit()
+        await session.execute(text('ANALYZE "user"'))
+
+    response = await client.get("/users/", params={"limit": 1})
+    assert response.json()["count"] == 2